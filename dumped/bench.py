@@ -0,0 +1,232 @@
+"""Micro-benchmarks for the dumper
+
+    python bench.py strings     StringUtils against the previous implementation
+    python bench.py pipeline    full Parser.parse() on synthetic data at 1x, 10x and 100x
+
+strings uses api_stats.json and the description files if present, otherwise the
+raw matchers of the stats.ndjson files shipped with the renderer, where nearly
+every string is unique. It also replays every call convert_stat_name gets while
+the fixtures are parsed in English and Russian, the workload the memo is for.
+pipeline generates its inputs with fixtures.py in a temporary directory and
+parses them twice: once untraced for the time and records/s, once under
+tracemalloc for the peak memory and the time per stage (slower than the untraced
+run, only comparable with each other). --json writes the full results.
+With --history it compares records/s and peak memory per scale against the
+median of the last passing runs in that file (the same format as golden.py
+--history) and fails if either is off by more than --tolerance, the run is
+appended to the file afterwards.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import pickle
+import tempfile
+import tracemalloc
+import main
+import fixtures
+import golden
+from parser import StringUtils
+from descriptions import iter_descriptions
+
+CWD = os.getcwd()
+LEGACY_NUMBER_PATTERN = re.compile(r'{\d+}')
+
+
+def legacy_convert_translations_in_modifier(modifier: str) -> str:
+    if len(modifier) == 0:
+        return modifier
+    open_square_bracket = modifier.find("[")
+    close_square_bracket = modifier.find("]")
+    while open_square_bracket >= 0 and close_square_bracket > 0:
+        key = modifier[open_square_bracket + 1:close_square_bracket]
+        if "|" in key:
+            key = key.split("|")[1]
+        modifier = modifier[:open_square_bracket] + key + modifier[close_square_bracket + 1:]
+        open_square_bracket = modifier.find("[")
+        close_square_bracket = modifier.find("]")
+    return modifier
+
+
+def legacy_convert_number_placeholder_in_modifier(modifier: str) -> str:
+    if len(modifier) == 0:
+        return modifier
+    for match in LEGACY_NUMBER_PATTERN.findall(modifier):
+        modifier = modifier.replace(match, "#")
+    return modifier.replace("{0:+d}", "+#")
+
+
+def legacy_convert_stat_name(modifier: str) -> str:
+    modifier = modifier.strip()
+    modifier = legacy_convert_translations_in_modifier(modifier)
+    modifier = legacy_convert_number_placeholder_in_modifier(modifier)
+    if len(modifier) == 0:
+        return None
+    if modifier[0] == "{" and modifier[1] == "}":
+        modifier = "#" + modifier[2:]
+    return modifier
+
+
+def load_string_corpus() -> list:
+    """Every string convert_stat_name sees during a run"""
+    corpus = []
+    if os.path.exists(f"{CWD}/api_stats.json"):
+        with open(f"{CWD}/api_stats.json", encoding="utf-8") as f:
+            for res in json.load(f)["result"]:
+                corpus.extend(entry.get("text") for entry in res.get("entries"))
+
+    for (root, dirs, files) in os.walk(f"{CWD}/descriptions"):
+        for file in files:
+            if file.endswith(".csd"):
+                for (_, strings, _) in iter_descriptions(os.path.join(root, file)):
+                    corpus.extend(strings)
+
+    if len(corpus) == 0:
+        data = f"{CWD}/../renderer/public/data"
+        for lang in os.listdir(data):
+            if os.path.exists(f"{data}/{lang}/stats.ndjson"):
+                with open(f"{data}/{lang}/stats.ndjson", encoding="utf-8") as f:
+                    for line in f:
+                        corpus.extend(matcher["string"] for matcher in json.loads(line)["matchers"] if matcher.get("type") == "raw")
+            # newer data keeps the raw strings in the alias table
+            if os.path.exists(f"{data}/{lang}/stats-alias.ndjson"):
+                with open(f"{data}/{lang}/stats-alias.ndjson", encoding="utf-8") as f:
+                    for line in f:
+                        alias = json.loads(line)
+                        if alias.get("type") == "raw":
+                            corpus.append(alias["string"])
+    return corpus
+
+
+def timed(fn, corpus: list, repeat: int, reset=None) -> float:
+    """Best time of repeat runs over the whole corpus, reset() is called before every run"""
+    best = None
+    for _ in range(repeat):
+        if reset != None:
+            reset()
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best == None else min(best, elapsed)
+    return best
+
+
+def record_parse_calls() -> list:
+    """Every string convert_stat_name gets during a parse of the 1x fixtures in English and Russian, in call order
+    Unlike the corpus this has the repeats of a real run: trade lookups and languages convert the same strings again
+    """
+    memoized = StringUtils.convert_stat_name
+    calls = []
+
+    def record(modifier: str) -> str:
+        calls.append(modifier)
+        return memoized(modifier)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = f"{tmp}/dumped"
+        fixtures.generate(root, 1)
+        StringUtils.convert_stat_name = staticmethod(record)
+        try:
+            main.init_worker(main.load_shared(root, fixtures.LANGUAGES, None))
+            for (lang, code) in fixtures.LANGUAGES.items():
+                main.create_parser(lang, code).parse()
+        finally:
+            StringUtils.convert_stat_name = staticmethod(memoized)
+    return calls
+
+
+def bench_corpus(name: str, corpus: list, repeat: int) -> list:
+    """Times the implementations over corpus, returns the strings where the output differs"""
+    print(f"{name}: {len(corpus)} strings, {len(set(corpus))} unique")
+    mismatches = [text for text in corpus if StringUtils.convert_stat_name(text) != legacy_convert_stat_name(text)]
+    for text in mismatches[:10]:
+        print(f"    mismatch: {text!r}: {StringUtils.convert_stat_name(text)!r} != {legacy_convert_stat_name(text)!r}")
+
+    legacy = timed(legacy_convert_stat_name, corpus, repeat)
+    single_pass = timed(StringUtils.convert_stat_name.__wrapped__, corpus, repeat)
+    # starts cold every time, the mismatch pass above already filled the cache
+    memoized = timed(StringUtils.convert_stat_name, corpus, repeat, StringUtils.convert_stat_name.cache_clear)
+    print(f"    legacy:      {legacy * 1000:8.2f} ms")
+    print(f"    single pass: {single_pass * 1000:8.2f} ms  ({legacy / single_pass:.2f}x)")
+    print(f"    memoized:    {memoized * 1000:8.2f} ms  ({legacy / memoized:.2f}x)")
+    return mismatches
+
+
+def bench_strings(repeat: int) -> bool:
+    mismatches = bench_corpus("corpus", load_string_corpus(), repeat)
+    mismatches += bench_corpus("parse calls", record_parse_calls(), repeat)
+    print(f"{len(mismatches)} mismatches")
+    return len(mismatches) == 0
+
+
+def bench_pipeline(scales: list, json_path: str, history: str = None, tolerance: float = 0.2) -> bool:
+    results = []
+    ok = True
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = f"{tmp}/dumped"
+            counts = fixtures.generate(root, scale)
+
+            # pickled before anything is parsed, so the profiled run doesn't start with what the timed one memoized
+            shared = pickle.dumps(main.load_shared(root, {"English": "en"}, None))
+
+            # timed without tracemalloc, tracing every allocation slows the parse down several times
+            main.init_worker(pickle.loads(shared))
+            main.SHARED["profile"] = False
+            start = time.perf_counter()
+            parser = main.create_parser("English", "en")
+            parser.parse()
+            wall = time.perf_counter() - start
+
+            # peak memory and the per stage breakdown come from a second, traced run
+            main.init_worker(pickle.loads(shared))
+            main.SHARED["profile"] = True
+            try:
+                profiled = main.create_parser("English", "en")
+                profiled.parse()
+            finally:
+                tracemalloc.stop()
+            profile = profiled.profiler.to_dict()
+            peak = max(stage["peak"] for stage in profile["stages"])
+
+            records = len(parser.mods) + len(parser.items) + len(parser.unique_items)
+            results.append({"scale": scale, "inputs": counts, "records": records, "seconds": wall, "records_per_second": records / wall, "peak": peak, "profile": profile})
+
+            print(f"scale {scale:>4}x: {counts['mods']:>7} mods, {records:>6} records in {wall * 1000:8.1f} ms, "
+                  f"{records / wall:>9.0f} records/s, peak {peak / (1 << 20):6.1f} MiB")
+            print("    per stage, under tracemalloc:")
+            for stage in profile["stages"]:
+                print(f"    {stage['name']:<22} {stage['wall'] * 1000:8.1f} ms  {stage['records']:>7} records")
+
+            if history:
+                result = {"records": records, "seconds": wall, "peak": peak}
+                problems = golden.regressions(golden.read_history(history, "pipeline", scale), result, tolerance)
+                for problem in problems:
+                    print(f"    {problem}")
+                golden.append_history(history, scale, result, not problems, "pipeline")
+                ok = ok and not problems
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(results, indent=4))
+    return ok
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Micro-benchmarks for the dumper")
+    args.add_argument("suite", choices=["strings", "pipeline"])
+    args.add_argument("--repeat", type=int, default=5, help="strings: runs per implementation, the best one counts")
+    args.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="pipeline: fixture sizes")
+    args.add_argument("--json", help="pipeline: write the results to this file")
+    args.add_argument("--history", help="pipeline: compare against and append to this ndjson file, fails on a regression")
+    args.add_argument("--tolerance", type=float, default=0.2, help="pipeline: allowed drop in records/s and growth in peak memory, 0.2 is 20%%")
+    args = args.parse_args()
+
+    if args.suite == "strings":
+        ok = bench_strings(args.repeat)
+    else:
+        ok = bench_pipeline(args.scales, args.json, args.history, args.tolerance)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,289 @@
+"""Compact binary form of stats.ndjson and items.ndjson (stats.bin, items.bin)
+
+Everything is little-endian and every section starts at a multiple of 8 bytes,
+so javascript can put a Uint32Array over a section of the fetched ArrayBuffer
+without copying anything:
+
+    header      magic "APTB", version, section count, 0           4 x u32
+    directory   per section: name, byte offset, byte length, width 4 x u32
+    sections    padded to 8 bytes
+
+Sections with a width are tables of u32 rows of that many words, records refer
+to each other by row index. Strings are indices into the string table:
+STRO holds count + 1 byte offsets into STRD (utf-8), string i is
+STRD[STRO[i]:STRO[i + 1]], NONE (0xffffffff) is a missing string.
+
+stats.bin
+    STAT  id, ref, better (i32), first MTCH row, MTCH count, first TRAD row, TRAD count
+    MTCH  string, negate, type
+    TRAD  trade type, trade id
+    IREF  fnv1a32(ref), STAT row                            sorted by hash
+    IMAT  fnv1a32(matcher string), STAT row                 sorted by hash
+    ALIA  variant string, STAT row, MTCH row of the canonical matcher, type
+    IALI  fnv1a32(variant string), ALIA row                 sorted by hash
+items.bin
+    ITEM  name, refName, namespace, icon, tradeTag, craftable category, flags, unique base,
+          ar min, ar max, ev min, ev max, es min, es max
+    INAM  fnv1a32(namespace::name), first ITEM row of the group
+    IREF  fnv1a32(namespace::refName), first ITEM row of the group
+
+Items sharing namespace::refName are consecutive rows, like the lines of items.ndjson.
+The hash indexes are the same as the .index.bin files, with rows instead of line starts.
+
+    python binary.py <file.bin>             prints the records as ndjson, for comparing against the ndjson files
+    python binary.py <stats.bin> aliases    prints the records of stats-alias.ndjson
+"""
+import sys
+import struct
+from index import HashIndex
+from output import dumps
+
+MAGIC = b"APTB"
+VERSION = 2
+NONE = 0xffffffff
+ALIGN = 8
+
+HEADER = struct.Struct("<4sIII")
+SECTION = struct.Struct("<4sIII")
+
+# ITEM flags
+CRAFTABLE = 1 << 0
+ARMOUR_AR = 1 << 1
+ARMOUR_EV = 1 << 2
+ARMOUR_ES = 1 << 3
+GEM = 1 << 4
+GEM_AWAKENED = 1 << 5
+GEM_TRANSFIGURED = 1 << 6
+UNIQUE = 1 << 7
+
+STAT_WIDTH = 7
+MATCHER_WIDTH = 3
+TRADE_WIDTH = 2
+ALIAS_WIDTH = 4
+ITEM_WIDTH = 14
+ARMOUR_KEYS = (("ar", ARMOUR_AR), ("ev", ARMOUR_EV), ("es", ARMOUR_ES))
+
+
+class StringTable:
+    """Deduplicated utf-8 strings, referenced by index"""
+
+    def __init__(self):
+        self.indices = {}
+        self.offsets = [0]
+        self.data = bytearray()
+
+    def add(self, text: str) -> int:
+        if text == None:
+            return NONE
+        index = self.indices.get(text)
+        if index == None:
+            index = self.indices[text] = len(self.offsets) - 1
+            self.data += text.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return index
+
+
+class Container:
+    """Collects the sections of one .bin file"""
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.sections = [] # (name, data, width)
+
+    def add(self, name: str, words: list, width: int) -> None:
+        self.sections.append((name, struct.pack(f"<{len(words)}I", *words), width))
+
+    def add_index(self, name: str, index: HashIndex) -> None:
+        self.sections.append((name, index.to_bytes(), 2))
+
+    def to_bytes(self) -> bytes:
+        sections = [("STRO", struct.pack(f"<{len(self.strings.offsets)}I", *self.strings.offsets), 1), ("STRD", bytes(self.strings.data), 0)] + self.sections
+        offset = pad(HEADER.size + SECTION.size * len(sections))
+        directory = []
+        body = []
+        for (name, data, width) in sections:
+            directory.append(SECTION.pack(name.encode("ascii"), offset, len(data), width))
+            body.append(data + b"\0" * (pad(len(data)) - len(data)))
+            offset += pad(len(data))
+        head = HEADER.pack(MAGIC, VERSION, len(sections), 0) + b"".join(directory)
+        return head + b"\0" * (pad(len(head)) - len(head)) + b"".join(body)
+
+
+def pad(size: int) -> int:
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+class StatsWriter:
+    """Builds stats.bin from the records written to stats.ndjson"""
+
+    def __init__(self):
+        self.container = Container()
+        self.stats = []
+        self.matchers = []
+        self.trade = []
+        self.aliases = []
+        self.matcher_rows = {} # canonical matcher string -> (STAT row, MTCH row), first one wins
+        self.index_ref = HashIndex("stats-ref")
+        self.index_matcher = HashIndex("stats-matcher")
+        self.index_alias = HashIndex("stats-alias")
+
+    def add(self, stat: dict) -> None:
+        strings = self.container.strings
+        row = len(self.stats) // STAT_WIDTH
+        matchers = stat["matchers"]
+        trade = [(type, id) for (type, ids) in stat["trade"]["ids"].items() for id in ids]
+        self.stats += [strings.add(stat["id"]), strings.add(stat["ref"]), stat["better"] & 0xffffffff,
+                       len(self.matchers) // MATCHER_WIDTH, len(matchers), len(self.trade) // TRADE_WIDTH, len(trade)]
+        for matcher in matchers:
+            self.matcher_rows.setdefault(matcher["string"], (row, len(self.matchers) // MATCHER_WIDTH))
+            self.matchers += [strings.add(matcher["string"]), 1 if matcher["negate"] else 0, strings.add(matcher["type"])]
+            self.index_matcher.add(matcher["string"], row)
+        for (type, id) in trade:
+            self.trade += [strings.add(type), strings.add(id)]
+        self.index_ref.add(stat["ref"], row)
+
+    def add_alias(self, alias: dict) -> None:
+        """Adds a record of stats-alias.ndjson, its canonical matcher has to be added already"""
+        (row, matcher_row) = self.matcher_rows[alias["matcher"]]
+        self.index_alias.add(alias["string"], len(self.aliases) // ALIAS_WIDTH)
+        self.aliases += [self.container.strings.add(alias["string"]), row, matcher_row, self.container.strings.add(alias["type"])]
+
+    def to_bytes(self) -> bytes:
+        self.container.add("STAT", self.stats, STAT_WIDTH)
+        self.container.add("MTCH", self.matchers, MATCHER_WIDTH)
+        self.container.add("TRAD", self.trade, TRADE_WIDTH)
+        self.container.add("ALIA", self.aliases, ALIAS_WIDTH)
+        self.container.add_index("IREF", self.index_ref)
+        self.container.add_index("IMAT", self.index_matcher)
+        self.container.add_index("IALI", self.index_alias)
+        return self.container.to_bytes()
+
+
+class ItemsWriter:
+    """Builds items.bin from the records written to items.ndjson"""
+
+    def __init__(self):
+        self.container = Container()
+        self.items = []
+        self.index_names = HashIndex("items-name")
+        self.index_ref_names = HashIndex("items-ref")
+
+    def add_group(self, name: str, key: str, items: list) -> None:
+        """Adds the records sharing namespace::refName, name and key are the index keys of the group"""
+        row = len(self.items) // ITEM_WIDTH
+        for item in items:
+            self.add(item)
+        self.index_names.add(name, row)
+        self.index_ref_names.add(key, row)
+
+    def add(self, item: dict) -> None:
+        strings = self.container.strings
+        flags = 0
+        craftable = item.get("craftable")
+        if craftable:
+            flags |= CRAFTABLE
+        armour = item.get("armour") or {}
+        bounds = []
+        for (key, flag) in ARMOUR_KEYS:
+            if key in armour:
+                flags |= flag
+            bounds += armour.get(key, [0, 0])
+        gem = item.get("gem")
+        if gem:
+            flags |= GEM | (GEM_AWAKENED if gem.get("awakened") else 0) | (GEM_TRANSFIGURED if gem.get("transfigured") else 0)
+        unique = item.get("unique")
+        if unique:
+            flags |= UNIQUE
+
+        self.items += [strings.add(item["name"]), strings.add(item["refName"]), strings.add(item["namespace"]),
+                       strings.add(item.get("icon")), strings.add(item.get("tradeTag")),
+                       strings.add(craftable.get("category")) if craftable else NONE, flags,
+                       strings.add(unique.get("base")) if unique else NONE] + bounds
+
+    def to_bytes(self) -> bytes:
+        self.container.add("ITEM", self.items, ITEM_WIDTH)
+        self.container.add_index("INAM", self.index_names)
+        self.container.add_index("IREF", self.index_ref_names)
+        return self.container.to_bytes()
+
+
+def read_sections(data: bytes) -> dict:
+    """name -> (list of u32 words or the raw bytes for width 0, width)"""
+    (magic, version, count, _) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} container")
+    sections = {}
+    for i in range(count):
+        (name, offset, size, width) = SECTION.unpack_from(data, HEADER.size + i * SECTION.size)
+        raw = data[offset:offset + size]
+        sections[name.decode("ascii")] = (raw if width == 0 else list(struct.unpack(f"<{size // 4}I", raw)), width)
+    return sections
+
+
+def string_reader(sections: dict):
+    """index -> str for the string table of a container"""
+    (offsets, _) = sections["STRO"]
+    (strings, _) = sections["STRD"]
+    return lambda i: None if i == NONE else strings[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+
+def decode_aliases(data: bytes):
+    """Yields the records of stats-alias.ndjson from a stats.bin"""
+    sections = read_sections(data)
+    text = string_reader(sections)
+    (aliases, _) = sections["ALIA"]
+    (matchers, _) = sections["MTCH"]
+    for row in range(len(aliases) // ALIAS_WIDTH):
+        (string, _, matcher, type) = aliases[row * ALIAS_WIDTH:(row + 1) * ALIAS_WIDTH]
+        yield {"string": text(string), "matcher": text(matchers[matcher * MATCHER_WIDTH]), "type": text(type)}
+
+
+def decode(data: bytes):
+    """Yields the records of a .bin file as the dicts of the matching ndjson file"""
+    sections = read_sections(data)
+    text = string_reader(sections)
+
+    if "STAT" in sections:
+        (stats, _) = sections["STAT"]
+        (matchers, _) = sections["MTCH"]
+        (trade, _) = sections["TRAD"]
+        for row in range(len(stats) // STAT_WIDTH):
+            (id, ref, better, matcher_start, matcher_count, trade_start, trade_count) = stats[row * STAT_WIDTH:(row + 1) * STAT_WIDTH]
+            ids = {}
+            for i in range(trade_start, trade_start + trade_count):
+                ids.setdefault(text(trade[i * TRADE_WIDTH]), []).append(text(trade[i * TRADE_WIDTH + 1]))
+            yield {
+                "ref": text(ref),
+                "better": better - (1 << 32) if better & 0x80000000 else better,
+                "id": text(id),
+                "matchers": [{"string": text(matchers[i * MATCHER_WIDTH]), "negate": matchers[i * MATCHER_WIDTH + 1] == 1, "type": text(matchers[i * MATCHER_WIDTH + 2])}
+                             for i in range(matcher_start, matcher_start + matcher_count)],
+                "trade": {"ids": ids}
+            }
+        return
+
+    (items, _) = sections["ITEM"]
+    for row in range(len(items) // ITEM_WIDTH):
+        (name, ref_name, namespace, icon, trade_tag, category, flags, base, *bounds) = items[row * ITEM_WIDTH:(row + 1) * ITEM_WIDTH]
+        out = {"name": text(name), "refName": text(ref_name), "namespace": text(namespace)}
+        if icon != NONE:
+            out["icon"] = text(icon)
+        if trade_tag != NONE:
+            out["tradeTag"] = text(trade_tag)
+        if flags & CRAFTABLE:
+            out["craftable"] = {"category": text(category)}
+        armour = {key: bounds[i * 2:i * 2 + 2] for (i, (key, flag)) in enumerate(ARMOUR_KEYS) if flags & flag}
+        if armour:
+            out["armour"] = armour
+        if flags & GEM:
+            out["gem"] = {"awakened": bool(flags & GEM_AWAKENED), "transfigured": bool(flags & GEM_TRANSFIGURED)}
+        if flags & UNIQUE:
+            out["unique"] = {"base": text(base)}
+        yield out
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    for record in (decode_aliases(data) if sys.argv[2:] == ["aliases"] else decode(data)):
+        print(dumps(record))
@@ -0,0 +1,64 @@
+"""On-disk cache for everything the parser derives from a single input file
+
+Entries are keyed by the content hash of the input file and the parser version,
+so they never have to be invalidated by hand: a changed file or a changed parser
+simply misses. Values are stored with pickle, which loads a lot faster than the
+original json or utf-16 text.
+"""
+import os
+import json
+import pickle
+import hashlib
+import output
+
+
+def file_hash(path: str) -> str:
+    """sha1 of the file content"""
+    hash = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hash.update(chunk)
+    return hash.hexdigest()
+
+
+class Cache:
+    def __init__(self, dir: str, version: str):
+        self.dir = dir          # None disables the cache
+        self.version = version  # bumped whenever the parsed output changes
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, kind: str, path: str, build, variant: str = ""):
+        """Returns build(path), or the cached result of it if path didn't change since
+        variant tells apart different builds from the same file
+        """
+        if self.dir == None:
+            return build(path)
+
+        key = hashlib.sha1(f"{kind}:{variant}:{self.version}:{file_hash(path)}".encode()).hexdigest()
+        cached = os.path.join(self.dir, kind, f"{key}.pickle")
+
+        if os.path.exists(cached):
+            with open(cached, "rb") as f:
+                self.hits += 1
+                return pickle.load(f)
+
+        self.misses += 1
+        value = build(path)
+
+        # other processes may be reading the same entry
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        with output.replacing(cached) as tmp:
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return value
+
+    def load_json(self, path: str):
+        """json.load with caching"""
+        return self.load("json", path, read_json)
+
+
+def read_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,60 @@
+"""Streaming reader for the .csd stat description files
+
+A description block looks like this, the english strings come first and every
+other language follows in its own lang sub-block:
+
+    description
+        2 local_minimum_added_fire_damage local_maximum_added_fire_damage
+        2
+            # # "Adds {0} to {1} [Fire|Fire] Damage"
+            1|# -1|# "{0}% reduced [Fire|Fire] Damage" negate 1
+        lang "German"
+        1
+            # # "Fügt {0} bis {1} [Fire|Feuer]schaden hinzu"
+
+The file is decoded and tokenized line by line, so memory stays flat no matter
+how big the description file is.
+"""
+
+ENGLISH = "English"
+
+
+def parse_translation_line(line: str) -> str:
+    """Extracts the translation string from a single translation line
+    Example: '#|-1 "{0}% reduced Attack Speed" negate 1': '{0}% reduced Attack Speed'
+    """
+    # everything before the first quote are the conditions (one per stat),
+    # everything after the last quote are flags like negate or reminderstring
+    start = line.find('"')
+    end = line.rfind('"')
+    translation_string = line[start + 1: end]
+
+    if "negate" in translation_string:
+        # mod has a negated version
+        end = translation_string.find('negate')
+        translation_string = translation_string[translation_string.find('"') + 1:end + len('negate')]
+
+    return translation_string
+
+
+def iter_descriptions(path: str):
+    """Yields (stat_ids, [translation strings], language) for every language block in the file"""
+    with open(path, encoding="utf-16") as f:
+        lines = (line.strip() for line in f)
+        lines = (line for line in lines if line)
+
+        stat_ids = None
+        for line in lines:
+            if line == "description" or line.startswith("description "):
+                # "<amount> <stat id> <stat id> ..."
+                header = next(lines).replace('"', "").split()
+                stat_ids = tuple(header[1:int(header[0]) + 1])
+                language = ENGLISH
+            elif stat_ids != None and line.startswith("lang "):
+                language = line[len("lang "):].strip('"')
+            elif stat_ids != None and line.isdigit():
+                strings = [parse_translation_line(next(lines)) for _ in range(int(line))]
+                yield (stat_ids, strings, language)
+            else:
+                # include, no_description etc. end the current block
+                stat_ids = None
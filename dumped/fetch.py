@@ -0,0 +1,217 @@
+"""Downloads the trade api reference data main.py reads from its working directory
+
+    python fetch.py                       refresh api_stats.json, api_items.json and api_static.json
+    python fetch.py --url http://127.0.0.1:8000
+    python fetch.py serve <directory>     serve the api_*.json files of a directory locally
+
+Responses are kept in .cache/http together with their ETag and Last-Modified
+validators. Every request is conditional, so an unchanged endpoint answers with
+304 and nothing is downloaded. If the server can't be reached the cached copy
+is used instead. A file in the working directory is only rewritten when its
+content changed, which keeps the content-hash cache of the parser warm.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import http.client
+import http.server
+from email.utils import formatdate
+from urllib.parse import urlsplit
+from output import read_file, write_file
+
+BASE_URL = "https://www.pathofexile.com"
+ENDPOINTS = {
+    "api_stats.json":   "/api/trade2/data/stats",
+    "api_items.json":   "/api/trade2/data/items",
+    "api_static.json":  "/api/trade2/data/static",
+}
+USER_AGENT = "corrupted-poe2-trade dumper"
+TIMEOUT = 30 # seconds
+
+
+class FetchError(Exception):
+    pass
+
+
+class Fetcher:
+    """Conditional GET requests over one kept-alive connection per host"""
+
+    def __init__(self, cache_dir: str, timeout: float = TIMEOUT):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.connections = {} # (scheme, host) -> connection
+        self.downloaded = 0
+        self.not_modified = 0
+        self.offline = 0
+
+    def connection(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        connection = self.connections.get((scheme, host))
+        if connection == None:
+            type = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connection = self.connections[(scheme, host)] = type(host, timeout=self.timeout)
+        return connection
+
+    def request(self, url: str, headers: dict) -> tuple:
+        """(status, headers, body), a connection the server closed in the meantime is reopened once"""
+        (scheme, host, path, query, _) = urlsplit(url)
+        if query:
+            path = f"{path}?{query}"
+        for attempt in range(2):
+            connection = self.connection(scheme, host)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                return (response.status, response.headers, response.read())
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                if attempt == 1:
+                    raise
+            except Exception:
+                connection.close()
+                raise
+
+    def cached(self, url: str) -> tuple:
+        """(validators, body) of the cached response, body is None if there is none"""
+        key = hashlib.sha1(url.encode()).hexdigest()
+        meta = read_file(f"{self.cache_dir}/http/{key}.json")
+        body = read_file(f"{self.cache_dir}/http/{key}.body")
+        if meta == None or body == None:
+            return ({}, None)
+        return (json.loads(meta), body)
+
+    def store(self, url: str, validators: dict, body: bytes) -> None:
+        key = hashlib.sha1(url.encode()).hexdigest()
+        os.makedirs(f"{self.cache_dir}/http", exist_ok=True)
+        # body first, validators without a matching body would answer 304 for nothing
+        write_file(f"{self.cache_dir}/http/{key}.body", body)
+        write_file(f"{self.cache_dir}/http/{key}.json", json.dumps({"url": url, **validators}).encode())
+
+    def fetch(self, url: str) -> bytes:
+        """Body of url, from the cache if the server says it didn't change or can't be reached"""
+        (validators, body) = self.cached(url)
+        headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+        if body != None:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            (status, response_headers, response_body) = self.request(url, headers)
+        except (OSError, http.client.HTTPException) as e:
+            return self.fallback(url, body, e)
+
+        if status == 304 and body != None:
+            self.not_modified += 1
+            return body
+        if status != 200:
+            return self.fallback(url, body, f"HTTP {status}")
+        try:
+            json.loads(response_body) # don't cache an error page
+        except ValueError as e:
+            return self.fallback(url, body, e)
+
+        self.downloaded += 1
+        self.store(url, {"etag": response_headers.get("ETag"), "last_modified": response_headers.get("Last-Modified")}, response_body)
+        return response_body
+
+    def fallback(self, url: str, body: bytes, error) -> bytes:
+        if body == None:
+            raise FetchError(f"Could not fetch {url} and there is no cached copy: {error}")
+        print(f"Could not fetch {url}, using the cached copy: {error}")
+        self.offline += 1
+        return body
+
+    def close(self) -> None:
+        for connection in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+
+def refresh(cwd: str, base_url: str = BASE_URL, cache_dir: str = None) -> list:
+    """Updates the api_*.json files in cwd, returns the ones that changed
+    A file that can't be fetched and isn't cached is left as it is, if it exists
+    """
+    fetcher = Fetcher(cache_dir if cache_dir != None else f"{cwd}/.cache")
+    changed = []
+    try:
+        for (file, path) in ENDPOINTS.items():
+            try:
+                body = fetcher.fetch(base_url.rstrip("/") + path)
+            except FetchError as e:
+                if not os.path.exists(f"{cwd}/{file}"):
+                    raise
+                print(f"{e}, keeping {file}")
+                continue
+
+            if read_file(f"{cwd}/{file}") != body:
+                write_file(f"{cwd}/{file}", body)
+                changed.append(file)
+    finally:
+        fetcher.close()
+    print(f"Trade api: {fetcher.downloaded} downloaded, {fetcher.not_modified} not modified, {fetcher.offline} offline, {len(changed)} changed")
+    return changed
+
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the api_*.json files of a directory under the trade api paths, with validators"""
+    protocol_version = "HTTP/1.1" # keep-alive, like the real api
+    directory = "."
+
+    def do_GET(self):
+        files = {path: file for (file, path) in ENDPOINTS.items()}
+        file = files.get(self.path)
+        body = read_file(f"{self.directory}/{file}") if file != None else None
+        if body == None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        last_modified = formatdate(os.path.getmtime(f"{self.directory}/{file}"), usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory: str, port: int = 0) -> http.server.ThreadingHTTPServer:
+    """Local stand-in for the trade api, port 0 picks a free one (server.server_port)"""
+    handler = type("Handler", (FixtureHandler,), {"directory": directory})
+    return http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Downloads the trade api data into the working directory")
+    args.add_argument("command", nargs="?", choices=["refresh", "serve"], default="refresh")
+    args.add_argument("directory", nargs="?", default=os.getcwd(), help="serve: directory with the api_*.json files")
+    args.add_argument("--url", default=BASE_URL, help="refresh: base url of the trade api")
+    args.add_argument("--port", type=int, default=8000, help="serve: port to listen on")
+    args = args.parse_args()
+
+    if args.command == "serve":
+        server = serve(args.directory, args.port)
+        print(f"Serving {args.directory} on http://127.0.0.1:{server.server_port}")
+        server.serve_forever()
+    else:
+        try:
+            refresh(os.getcwd(), args.url)
+        except FetchError as e:
+            print(e)
+            sys.exit(1)
@@ -0,0 +1,197 @@
+"""Synthetic input data for benchmarking the parser without the game files
+
+Generates everything main.py expects in its working directory (descriptions/,
+tables/<lang>/, api_stats.json, api_items.json, api_static.json) plus the
+renderer output directory next to it (<directory>/../renderer/public/data),
+at a configurable scale. The same seed and scale always produce the same files.
+
+    python fixtures.py <directory> --scale 10
+"""
+import os
+import json
+import random
+import argparse
+
+# amount of rows at scale 1, roughly a tenth of the real game data
+STATS = 300
+TIERS = 5
+BASE_ITEMS = 200
+UNIQUES = 50
+GEM_SHARE = 0.15
+
+LANGUAGES = {
+    "English": "en",
+    "Russian": "ru",
+}
+WORDS = ["Fire", "Cold", "Lightning", "Chaos", "Physical", "Attack", "Cast", "Movement", "Critical", "Life",
+         "Mana", "Energy", "Shield", "Armour", "Evasion", "Spell", "Minion", "Totem", "Trap", "Projectile"]
+TEMPLATES = [
+    ('{0}% increased [WORD|WORD] Damage', '{0}% reduced [WORD|WORD] Damage'),
+    ('{0:+d} to maximum [WORD|WORD]', None),
+    ('{0}% increased WORD Speed', '{0}% reduced WORD Speed'),
+    ('Adds {0} to {1} [WORD|WORD] Damage', None),
+    ('{0}% chance to gain WORD on Kill', None),
+]
+CLASSES = [
+    ("Helmet", "Helmet"),
+    ("Body Armour", "Body Armour"),
+    ("One Hand Sword", "Sword"),
+    ("Bow", "Bow"),
+    ("Ring", "Ring"),
+    ("Amulet", "Amulet"),
+    ("Active Skill Gem", "Gem"),
+    ("StackableCurrency", "Currency"),
+    ("LifeFlask", None),
+]
+
+
+def write_json(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def write_table(root: str, lang: str, name: str, rows: list) -> None:
+    write_json(f"{root}/tables/{lang}/{name}.json", [{"_index": i, **row} for (i, row) in enumerate(rows)])
+
+
+def russian(text: str) -> str:
+    """Fake translation, keeps the placeholders and brackets intact"""
+    return text.replace("increased", "повышение").replace("reduced", "снижение").replace("to", "к").replace("Damage", "урон")
+
+
+def description_block(stat_ids: list, strings: list, translations: dict) -> str:
+    """A single description block in the .csd format"""
+    def lines(strings):
+        out = [f"\t{len(strings)}"]
+        for (i, (string, negate)) in enumerate(strings):
+            conditions = " ".join("#" if negate == None else ("1|#" if i == 0 else "#|-1") for _ in stat_ids)
+            flags = " negate 1" if negate else ""
+            out.append(f'\t\t{conditions} "{string}"{flags}')
+        return out
+
+    block = ["description", f"\t{len(stat_ids)} {' '.join(stat_ids)}"] + lines(strings)
+    for (lang, strings) in translations.items():
+        block.append(f'\tlang "{lang}"')
+        block.extend(lines(strings))
+    return "\n".join(block) + "\n\n"
+
+
+def generate(root: str, scale: int = 1, seed: int = 0) -> dict:
+    """Writes a full set of inputs to root, returns the amount of generated rows"""
+    rng = random.Random(seed)
+    stats = []          # stat ids, in Stats order
+    descriptions = []   # (stat ids, strings, translations)
+    api_stats = []
+
+    for i in range(STATS * scale):
+        (positive, negative) = rng.choice(TEMPLATES)
+        word = rng.choice(WORDS)
+        positive = positive.replace("WORD", word)
+        stat_ids = [f"synthetic_stat_{i}"]
+        if "{1}" in positive:
+            # hybrid description, minimum and maximum are separate stats
+            stat_ids = [f"synthetic_minimum_stat_{i}", f"synthetic_maximum_stat_{i}"]
+        stats.extend(stat_ids)
+
+        strings = [(positive, None if negative == None else False)]
+        if negative != None:
+            strings.append((negative.replace("WORD", word), True))
+        translations = {"Russian": [(russian(string), negate) for (string, negate) in strings]} if rng.random() < 0.5 else {}
+        descriptions.append((stat_ids, strings, translations))
+
+        if rng.random() < 0.8:
+            text = positive.replace(f"[{word}|{word}]", word).replace("{0:+d}", "+#").replace("{0}", "#").replace("{1}", "#")
+            api_stats.append({"id": f"explicit.stat_{i}", "text": text, "type": "explicit"})
+            api_stats.append({"id": f"implicit.stat_{i}", "text": text, "type": "implicit"})
+
+    # spread the descriptions over a few files, including a sub directory and a skipped one
+    files = ["stat_descriptions.csd", "gem_stat_descriptions.csd", "sub/monster_stat_descriptions.csd"]
+    contents = {file: ['include "Metadata/StatDescriptions/stat_descriptions.csd"\n\n'] for file in files}
+    for (i, description) in enumerate(descriptions):
+        contents[files[i % len(files)]].append(description_block(*description))
+    contents["_skipped/skipped.csd"] = [description_block(["synthetic_skipped"], [("Skipped", None)], {})]
+    for (file, blocks) in contents.items():
+        path = f"{root}/descriptions/{file}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-16") as f:
+            f.write("".join(blocks))
+
+    stat_index = {stat_id: i for (i, stat_id) in enumerate(stats)}
+    mods = []
+    for (stat_ids, _, _) in descriptions:
+        keys = [stat_index[stat_id] for stat_id in stat_ids]
+        if rng.random() < 0.1:
+            # mod with an additional, independent stat
+            keys.append(rng.randrange(len(stats)))
+        for tier in range(TIERS):
+            mod = {"Id": f"{stat_ids[0]}_{tier}", "Domain": 1, "Name": ""}
+            for k in range(4):
+                mod[f"StatsKey{k + 1}"] = keys[k] if k < len(keys) else None
+            mods.append(mod)
+    mods.append({"Id": "NoStats", "Domain": 1, "Name": "", "StatsKey1": None, "StatsKey2": None, "StatsKey3": None, "StatsKey4": None})
+
+    base_items = []
+    armour_types = []
+    weapon_types = []
+    skill_gems = []
+    api_items = []
+    api_static = []
+    uniques = 0
+    first_base = None
+    duplicates = []
+    for i in range(BASE_ITEMS * scale):
+        class_key = rng.randrange(len(CLASSES))
+        if rng.random() < GEM_SHARE:
+            class_key = CLASSES.index(("Active Skill Gem", "Gem"))
+        name = f"Synthetic {CLASSES[class_key][0]} {i}"
+        base_items.append({"Id": f"Metadata/Items/Synthetic{i}", "Name": name, "ItemClassesKey": class_key, "DropLevel": rng.randint(1, 80), "TradeMarketCategory": None})
+
+        if class_key in (0, 1):
+            armour = rng.choice([(10, 20, 0, 0, 0, 0), (0, 0, 10, 20, 0, 0), (0, 0, 0, 0, 10, 20), (10, 20, 10, 20, 0, 0)])
+            armour_types.append(dict(zip(["ArmourMin", "ArmourMax", "EvasionMin", "EvasionMax", "EnergyShieldMin", "EnergyShieldMax"], armour), BaseItemTypesKey=i))
+        elif class_key in (2, 3):
+            weapon_types.append({"BaseItemTypesKey": i, "DamageMin": 1, "DamageMax": 10})
+        elif CLASSES[class_key][0] == "Active Skill Gem":
+            skill_gems.append({"BaseItemTypesKey": i, "IsVaalVariant": False, "IsSupport": rng.random() < 0.5})
+        elif CLASSES[class_key][0] == "StackableCurrency":
+            api_static.append({"id": f"synthetic-{i}", "text": name, "image": f"/gen/image/synthetic/{i}.png"})
+
+        if uniques < UNIQUES * scale and class_key < 6:
+            uniques += 1
+            first_base = first_base or name
+            api_items.append({"name": f"Synthetic Unique {i}", "type": name, "text": f"Synthetic Unique {i} {name}", "flags": {"unique": True}})
+            if rng.random() < 0.1:
+                # same unique on a second base further down the list, both records have to end up next to each other
+                duplicates.append({"name": f"Synthetic Unique {i}", "type": first_base, "text": "", "flags": {"unique": True}})
+        api_items.append({"type": name, "text": name})
+    api_items.extend(duplicates)
+
+    for (lang, code) in LANGUAGES.items():
+        write_table(root, lang, "Stats", [{"Id": stat_id, "Text": "", "HASH32": i} for (i, stat_id) in enumerate(stats)])
+        write_table(root, lang, "Mods", mods)
+        write_table(root, lang, "ItemClassCategories", [{"Id": category, "Text": category} for (_, category) in CLASSES if category])
+        categories = [category for (_, category) in CLASSES if category]
+        write_table(root, lang, "ItemClasses", [{"Id": id, "Name": id, "ItemClassCategory": categories.index(category) if category else None, "TradeMarketCategory": None} for (id, category) in CLASSES])
+        write_table(root, lang, "BaseItemTypes", base_items)
+        write_table(root, lang, "ArmourTypes", armour_types)
+        write_table(root, lang, "WeaponTypes", weapon_types)
+        write_table(root, lang, "SkillGems", skill_gems)
+        write_table(root, lang, "SkillGemInfo", [{"Id": f"gem{i}", "Description": "", "SkillGemsKey": i} for i in range(len(skill_gems))])
+        os.makedirs(f"{root}/../renderer/public/data/{code}", exist_ok=True)
+
+    write_json(f"{root}/api_stats.json", {"result": [{"id": "explicit", "label": "Explicit", "entries": api_stats}]})
+    write_json(f"{root}/api_items.json", {"result": [{"id": "synthetic", "label": "Synthetic", "entries": api_items}]})
+    write_json(f"{root}/api_static.json", {"result": [{"id": "Currency", "label": "Currency", "entries": api_static}]})
+
+    return {"stats": len(stats), "descriptions": len(descriptions), "mods": len(mods), "base_items": len(base_items), "uniques": uniques}
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Generates synthetic parser inputs")
+    args.add_argument("directory")
+    args.add_argument("--scale", type=int, default=1)
+    args.add_argument("--seed", type=int, default=0)
+    args = args.parse_args()
+
+    print(generate(args.directory, args.scale, args.seed))
@@ -0,0 +1,252 @@
+"""Golden-data regression harness for the parser
+
+    python golden.py check [--scales 1]     parse the synthetic fixtures and compare against golden/
+    python golden.py update [--scales 1]    accept the current output as the golden data
+    python golden.py check --history golden-history.ndjson
+
+Every scale generates its inputs with fixtures.py (descriptions/, tables/ and
+the trade api files) in a temporary directory and runs the full Parser.parse()
+for every fixture language, with the binary and trigram outputs enabled.
+golden/<scale>x/ keeps the fixture row counts, the ndjson files and files.json
+of every language, the sha1 and size of every generated file, so it also covers
+manifest.json, the indexes and the .bin files. A changed ndjson file is reported
+by record key.
+
+Each scale is parsed twice. The timed run parses the languages one after another
+in one process with one set of shared inputs, like main.py -j 1. The second run
+is under tracemalloc for the peak memory and gives every language its own copy
+of the shared inputs, like the workers of main.py --jobs. Both have to write the
+same files, anything one language leaves in the shared inputs that changes the
+output of another shows up as a difference. Every language also has to have the
+same ref and trade ids as English for each stat id, only the matchers are
+translated. --history appends records/s and peak memory per scale to an ndjson
+file, to follow the scaling behaviour over time.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import pickle
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+import main
+import fixtures
+import output
+from cache import file_hash
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+FILES = "files.json" # list_files() of every language
+NDJSON_KEYS = {
+    "items.ndjson":         output.item_key,
+    "stats.ndjson":         output.stat_key,
+    "stats-alias.ndjson":   output.alias_key,
+}
+EXAMPLES = 5
+
+
+def run(shared: bytes, isolated: bool) -> dict:
+    """Parses every fixture language, returns the amount of records and the time it took
+    shared is the pickled main.SHARED, isolated gives every language its own copy the way the workers of --jobs get it
+    """
+    records = 0
+    start = time.perf_counter()
+    main.init_worker(pickle.loads(shared))
+    for (lang, code) in fixtures.LANGUAGES.items():
+        if isolated:
+            main.init_worker(pickle.loads(shared))
+        parser = main.create_parser(lang, code)
+        parser.parse()
+        records += len(parser.mods) + len(parser.items) + len(parser.unique_items)
+    return {"records": records, "seconds": time.perf_counter() - start}
+
+
+def parse_fixtures(root: str, scale: int) -> dict:
+    """Generates the inputs for scale in root and parses them twice, serially for the time and isolated for the peak memory
+    serial is list_files() of every language after the serial run
+    """
+    inputs = fixtures.generate(root, scale)
+    shared = main.load_shared(root, fixtures.LANGUAGES, None)
+    shared.update({"incremental": False, "profile": False, "dump": False, "binary_output": True, "search_index": True})
+    # pickled before anything is parsed, so neither run starts with what the other one memoized
+    shared = pickle.dumps(shared)
+    data = f"{root}/../renderer/public/data"
+
+    result = run(shared, isolated=False)
+    serial = {code: list_files(f"{data}/{code}") for code in fixtures.LANGUAGES.values()}
+    tracemalloc.start()
+    try:
+        run(shared, isolated=True)
+        result["peak"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"inputs": inputs, "serial": serial, **result}
+
+
+def list_files(path: str) -> dict:
+    """sha1 and size of every generated file, manifest.json only lists the ones the renderer fetches"""
+    files = {}
+    for name in sorted(os.listdir(path)):
+        if os.path.isfile(f"{path}/{name}") and not name.endswith(".tmp"):
+            files[name] = {"sha1": file_hash(f"{path}/{name}"), "size": os.path.getsize(f"{path}/{name}")}
+    return files
+
+
+def compare(golden: str, data: str, code: str) -> list:
+    """Differences between the golden data of one language and the generated one"""
+    problems = []
+    with open(f"{golden}/{FILES}", encoding="utf-8") as f:
+        expected = json.load(f)
+    actual = list_files(data)
+    for name in sorted(expected.keys() | actual.keys()):
+        if name not in actual:
+            problems.append(f"{code}/{name}: not written")
+        elif name not in expected:
+            problems.append(f"{code}/{name}: not in the golden data")
+        elif expected[name]["sha1"] != actual[name]["sha1"]:
+            key = NDJSON_KEYS.get(name)
+            if key == None:
+                problems.append(f"{code}/{name}: content changed")
+                continue
+            diff = output.diff_ndjson(output.read_file(f"{golden}/{name}"), output.read_file(f"{data}/{name}"), key)
+            summary = ", ".join(f"{len(keys)} {kind}" for (kind, keys) in diff.items() if keys) or "same records, different bytes"
+            problems.append(f"{code}/{name}: {summary}")
+            for (kind, keys) in diff.items():
+                for key in keys[:EXAMPLES]:
+                    problems.append(f"    {kind}: {key}")
+    return problems
+
+
+def check(scale: int, result: dict, data: str) -> list:
+    golden = f"{GOLDEN_DIR}/{scale}x"
+    if not os.path.isdir(golden):
+        return [f"no golden data, run python golden.py update --scales {scale}"]
+
+    with open(f"{golden}/fixture.json", encoding="utf-8") as f:
+        inputs = json.load(f)
+    if inputs != result["inputs"]:
+        return [f"fixtures.py generates different inputs ({inputs} before, {result['inputs']} now), update the golden data if that's intended"]
+
+    problems = []
+    for code in fixtures.LANGUAGES.values():
+        problems.extend(compare(f"{golden}/{code}", f"{data}/{code}", code))
+    return problems
+
+
+def check_isolation(result: dict, data: str) -> list:
+    """Files that differ between the serial and the isolated run"""
+    problems = []
+    for (code, serial) in result["serial"].items():
+        isolated = list_files(f"{data}/{code}")
+        for name in sorted(serial.keys() | isolated.keys()):
+            if serial.get(name) != isolated.get(name):
+                problems.append(f"{code}/{name}: differs between the serial run and the isolated run of every language")
+    return problems
+
+
+def check_languages(data: str) -> list:
+    """Stats of every language have to keep the english ref and trade ids, only the matchers are translated"""
+    english = {stat["id"]: stat for stat in output.read_ndjson(f"{data}/en/stats.ndjson").values()}
+    problems = []
+    for code in fixtures.LANGUAGES.values():
+        if code == "en":
+            continue
+        different = [stat["id"] for stat in output.read_ndjson(f"{data}/{code}/stats.ndjson").values()
+                     if stat["id"] not in english or (stat["ref"], stat["trade"]) != (english[stat["id"]]["ref"], english[stat["id"]]["trade"])]
+        if different:
+            problems.append(f"{code}/stats.ndjson: {len(different)} stats with a different ref or trade ids than en")
+            problems.extend(f"    {id}" for id in different[:EXAMPLES])
+    return problems
+
+
+def update(scale: int, result: dict, data: str) -> None:
+    golden = f"{GOLDEN_DIR}/{scale}x"
+    if os.path.isdir(golden):
+        shutil.rmtree(golden)
+    for code in fixtures.LANGUAGES.values():
+        os.makedirs(f"{golden}/{code}")
+        for name in NDJSON_KEYS:
+            shutil.copyfile(f"{data}/{code}/{name}", f"{golden}/{code}/{name}")
+        with open(f"{golden}/{code}/{FILES}", "w", encoding="utf-8") as f:
+            f.write(json.dumps(list_files(f"{data}/{code}"), indent=4))
+    with open(f"{golden}/fixture.json", "w", encoding="utf-8") as f:
+        f.write(json.dumps(result["inputs"], indent=4))
+
+
+def append_history(path: str, scale: int, result: dict, ok: bool, suite: str = "golden") -> None:
+    """suite tells apart the golden.py and bench.py pipeline numbers, they are measured differently"""
+    entry = {
+        "suite": suite,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "scale": scale,
+        "records": result["records"],
+        "seconds": round(result["seconds"], 4),
+        "records_per_second": round(result["records"] / result["seconds"]),
+        "peak": result["peak"],
+        "ok": ok,
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def read_history(path: str, suite: str, scale: int) -> list:
+    """Passing entries of suite at scale, oldest first, entries without a suite are from golden.py"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [entry for entry in entries if entry.get("suite", "golden") == suite and entry["scale"] == scale and entry["ok"]]
+
+
+def regressions(history: list, result: dict, tolerance: float, window: int = 5) -> list:
+    """Compares records/s and peak memory of result against the median of the last window entries
+    Empty if there is no history yet
+    """
+    history = history[-window:]
+    if not history:
+        return []
+    median = lambda values: sorted(values)[len(values) // 2]
+    problems = []
+    speed = result["records"] / result["seconds"]
+    baseline = median([entry["records_per_second"] for entry in history])
+    if speed < baseline * (1 - tolerance):
+        problems.append(f"records/s regressed: {speed:.0f} against {baseline:.0f} ({speed / baseline - 1:+.0%})")
+    baseline = median([entry["peak"] for entry in history])
+    if result["peak"] > baseline * (1 + tolerance):
+        problems.append(f"peak memory regressed: {result['peak'] / (1 << 20):.1f} MiB against {baseline / (1 << 20):.1f} MiB ({result['peak'] / baseline - 1:+.0%})")
+    return problems
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Compares the parser output on synthetic data against golden/")
+    args.add_argument("command", choices=["check", "update"])
+    args.add_argument("--scales", type=int, nargs="+", default=[1], help="fixture sizes, see fixtures.py")
+    args.add_argument("--history", help="append records/s and peak memory per scale to this ndjson file")
+    args = args.parse_args()
+
+    ok = True
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = parse_fixtures(f"{tmp}/dumped", scale)
+            data = f"{tmp}/renderer/public/data"
+            # golden data that depends on the order the languages were parsed in, or where a language lost the english ref or trade ids, is never accepted
+            problems = check_isolation(result, data) + check_languages(data)
+            if args.command == "update" and not problems:
+                update(scale, result, data)
+            elif args.command == "check":
+                problems += check(scale, result, data)
+
+        print(f"scale {scale:>4}x: {result['records']:>7} records in {result['seconds'] * 1000:8.1f} ms, "
+              f"{result['records'] / result['seconds']:>9.0f} records/s, peak {result['peak'] / (1 << 20):6.1f} MiB: "
+              + ("updated" if args.command == "update" and not problems else "ok" if not problems else f"{sum(not problem.startswith(' ') for problem in problems)} differences"))
+        for problem in problems:
+            print(f"    {problem}")
+        ok = ok and not problems
+        if args.history:
+            append_history(args.history, scale, result, not problems)
+
+    sys.exit(0 if ok else 1)
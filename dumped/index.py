@@ -0,0 +1,58 @@
+"""Binary lookup indexes for the ndjson files consumed by the renderer
+
+Mirrors renderer/src/assets/make-index-files.mjs: every index is a flat table of
+little-endian Uint32 pairs [fnv1a32(key), lineStart], sorted by hash, which
+renderer/src/assets/data/index.ts binary-searches.
+lineStart is an offset into the ndjson *string* as seen by javascript, so it's
+counted in UTF-16 code units, not bytes.
+"""
+import struct
+
+FNV_OFFSET_BASIS = 0x811c9dc5
+FNV_PRIME = 0x01000193
+INDEX_ENTRY = struct.Struct("<II")
+
+
+def fnv1a32(text: str) -> int:
+    """fnv1a 32bit hash over the utf-8 bytes of text (same as @sindresorhus/fnv1a)"""
+    hash = FNV_OFFSET_BASIS
+    for byte in text.encode("utf-8"):
+        hash ^= byte
+        hash = (hash * FNV_PRIME) & 0xffffffff
+    return hash
+
+
+def js_length(text: str) -> int:
+    """Length of text in UTF-16 code units, the unit javascript strings are indexed by"""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+class HashIndex:
+    """Collects [hash, lineStart] entries for one .index.bin file"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.entries = []   # (hash, lineStart)
+        self.keys = {}      # hash -> first key seen with that hash
+        self.collisions = [] # (hash, key, other key)
+
+    def add(self, key: str, start: int) -> None:
+        """Adds a key pointing to the line starting at start"""
+        hash = fnv1a32(key)
+        other = self.keys.setdefault(hash, key)
+        if other != key:
+            self.collisions.append((hash, other, key))
+        self.entries.append((hash, start))
+
+    def report(self) -> None:
+        """Prints all hash collisions between different keys"""
+        for (hash, key, other) in self.collisions:
+            print(f"fnv1a32 collision in {self.name}: {key!r} and {other!r} ({hash:#010x})")
+
+    def to_bytes(self) -> bytes:
+        """Sorted by hash, ties keep insertion order (same as Array.prototype.sort)"""
+        self.entries.sort(key=lambda entry: entry[0])
+        return b"".join(INDEX_ENTRY.pack(hash, start) for (hash, start) in self.entries)
+
@@ -13,55 +13,199 @@ SnosMe - https://github.com/SnosMe/poe-dat-viewer
 SnosMe - https://github.com/SnosMe/awakened-poe-trade
 """
 import os
-import json
-import re
-from parser import Parser, StringUtils
+import sys
+import time
+import traceback
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from parser import Parser, TradeStatIndex, PARSER_VERSION
+from cache import Cache, read_json
+from tables import Tables, load_config
+from profiler import Profiler
+import fetch
+import validate
+import watch
+import tradedb
+from tradedb import parse_api_modifier_trade_ids, parse_api_statics
 CWD = os.getcwd()
 LANGUAGES = {
     "English": "en",
+    "Russian": "ru",
+    "Korean": "ko",
+    "Traditional Chinese": "cmn-Hant",
     # "German": "de"
 }
 
-TRANSLATION_FILES       = os.listdir(f"{CWD}/descriptions")
-TRADE_API_STATS         = json.loads(open(f"{CWD}/api_stats.json").read()) # content of https://www.pathofexile.com/api/trade2/data/stats
-TRADE_API_ITEMS         = json.loads(open(f"{CWD}/api_items.json").read()) # content of https://www.pathofexile.com/api/trade2/data/items
-TRADE_API_STATIC        = json.loads(open(f"{CWD}/api_static.json").read()) # content of https://www.pathofexile.com/api/trade2/data/static
-modifier_trade_ids = {}
-item_trade_statics = {}
+SHARED = {} # language independent inputs, filled once in the parent and handed to every worker
+FLAGS = ("incremental", "profile", "dump", "binary_output", "search_index") # the options in SHARED, kept when it's loaded again
+API_FILES = ("api_stats.json", "api_items.json", "api_static.json")
+SHARED_TABLES = ("Stats", "Mods") # loaded once for every language, see load_shared_tables()
 
-def parse_api_modifier_trade_ids():
-    """Parses the trade ids from the trade api"""
-    for res in TRADE_API_STATS["result"]:
-        for entry in res.get("entries"):
-            id = entry.get("id")
-            text = entry.get("text")
-            type = entry.get("type")
-            text = StringUtils.convert_stat_name(text)
-            
-            if text not in modifier_trade_ids:
-                modifier_trade_ids[text] = {}
-                
-            if type not in modifier_trade_ids[text]:
-                modifier_trade_ids[text][type] = []
-            
-            modifier_trade_ids[text][type].append(id)
+def find_translation_files(cwd: str) -> list:
+    """Lists all .csd files in the descriptions folder, directories starting with _ are skipped"""
+    files = []
+    # sorted, later files override earlier ones and listdir order depends on the file system
+    for file in sorted(os.listdir(f"{cwd}/descriptions")):
+        if os.path.isdir(f"{cwd}/descriptions/{file}"):
+            # traverse directories if it doesnt start with _
+            if not file.startswith("_"):
+                for _file in sorted(os.listdir(f"{cwd}/descriptions/{file}")):
+                    files.append(f"{file}/{_file}")
+        elif ".csd" in file:
+            files.append(file)
+    return files
 
-def parse_api_statics():
-    """Parses the static data from the trade api, such as images or trade-tags"""
-    for static in TRADE_API_STATIC["result"]:
-        for entry in static.get("entries"):
-            id = entry.get("id")
-            name = entry.get("text")
-            image = entry.get("image")
-            item_trade_statics[name] = {
-                "tradeTag": id,
-                "icon": f"https://web.poecdn.com/{image}",
-            }
+def load_shared_tables(cwd: str, languages: dict, cache_dir: str) -> dict:
+    """Stats and Mods keys are the same in every language, so they are taken from the first exported one"""
+    lang = next(iter(languages))
+    tables = Tables(f"{cwd}/tables/{lang}", load_config(), Cache(cache_dir, PARSER_VERSION))
+    return {
+        "stat_keys":            Parser.load_stat_keys(tables["Stats"]),
+        "mods_table":           tables["Mods"],
+    }
+
+def load_shared(cwd: str, languages: dict, cache_dir: str) -> dict:
+    """Loads everything that doesn't depend on the language"""
+    if cache_dir != None:
+        # compiled once into .cache/trade.sqlite, see tradedb.py
+        (trade_api_modifiers, item_trade_statics) = tradedb.open_db(cwd, cache_dir)
+    else:
+        trade_api_modifiers = TradeStatIndex(parse_api_modifier_trade_ids(read_json(f"{cwd}/api_stats.json"))) # content of https://www.pathofexile.com/api/trade2/data/stats
+        item_trade_statics = parse_api_statics(read_json(f"{cwd}/api_static.json")) # content of https://www.pathofexile.com/api/trade2/data/static
+    return {
+        "cwd":                  cwd,
+        "cache_dir":            cache_dir,
+        "languages":            list(languages),
+        "incremental":          False,
+        "profile":              False,
+        "dump":                 False,
+        "binary_output":        False,
+        "search_index":         False,
+        "translation_files":    find_translation_files(cwd),
+        "trade_api_modifiers":  trade_api_modifiers,
+        "trade_api_items":      read_json(f"{cwd}/api_items.json"), # content of https://www.pathofexile.com/api/trade2/data/items
+        "item_trade_statics":   item_trade_statics,
+        **load_shared_tables(cwd, languages, cache_dir),
+    }
+
+def init_worker(shared: dict) -> None:
+    SHARED.update(shared)
+
+def create_parser(lang: str, code: str) -> Parser:
+    return Parser(SHARED["cwd"], lang, code, SHARED["translation_files"], SHARED["trade_api_modifiers"], SHARED["trade_api_items"], SHARED["item_trade_statics"],
+                  stat_keys=SHARED["stat_keys"], mods_table=SHARED["mods_table"], cache=Cache(SHARED["cache_dir"], PARSER_VERSION), incremental=SHARED["incremental"], profiler=Profiler(SHARED["profile"]), dump=SHARED["dump"], binary_output=SHARED["binary_output"], search_index=SHARED["search_index"], languages=SHARED["languages"])
+
+def run_parser(lang: str, code: str) -> str:
+    print(f"Starting parser for {lang}")
+    parser = create_parser(lang, code)
+    parser.parse()
+    if SHARED["profile"]:
+        parser.profiler.write(f"{SHARED['cwd']}/profile_{code}.json")
+    print(f"{lang}: {parser.cache.hits} cached, {parser.cache.misses} parsed")
+    return lang
+
+def start_parsers(languages: dict) -> dict:
+    """Parses every language in this process and keeps the parsers, for watch mode"""
+    parsers = {}
+    for (lang, code) in languages.items():
+        print(f"Starting parser for {lang}")
+        parsers[lang] = create_parser(lang, code)
+        parsers[lang].parse()
+    return parsers
+
+def watch_languages(languages: dict, cache_dir: str, check: bool, interval: float) -> None:
+    """Keeps the parsers resident and only re-parses what changed, see Parser.update()"""
+    parsers = start_parsers(languages)
+    pending = set() # changes of failed updates, retried with the next change
+    
+    def on_change(changed: list) -> None:
+        pending.update(changed)
+        try:
+            apply_changes(sorted(pending))
+        except Exception:
+            # a half exported table or a broken .csd, the written data stays as it was until the file is fixed
+            traceback.print_exc()
+            print("Update failed, keeping the previous data and watching for the next change")
+            return
+        pending.clear()
+    
+    def apply_changes(changed: list) -> None:
+        start = time.perf_counter()
+        if any(file in API_FILES for file in changed):
+            # the trade api data is shared by everything, start over
+            print("Trade api data changed, parsing everything again")
+            flags = {key: SHARED[key] for key in FLAGS}
+            # the old parsers still have trade.sqlite open, it's rebuilt by load_shared
+            tradedb.close_db(SHARED["trade_api_modifiers"], SHARED["item_trade_statics"])
+            init_worker(load_shared(CWD, languages, cache_dir))
+            SHARED.update(flags)
+            parsers.update(start_parsers(languages))
+        else:
+            translation_files = find_translation_files(CWD)
+            shared_tables = {}
+            if any(file.startswith("tables/") and os.path.splitext(os.path.basename(file))[0] in SHARED_TABLES for file in changed):
+                # every parser uses the shared copies, not only the ones of the language whose tables changed
+                shared_tables = load_shared_tables(CWD, languages, cache_dir)
+                SHARED.update(shared_tables)
+            for (lang, parser) in parsers.items():
+                parser.update(changed, translation_files, **shared_tables)
+        print(f"Updated {len(changed)} changed files in {time.perf_counter() - start:.2f}s")
+        if check:
+            validate.validate_all(CWD, list(languages.values()))
+    
+    watch.watch(CWD, ["descriptions"] + [f"tables/{lang}" for lang in languages] + list(API_FILES), on_change, interval)
 
 if __name__ == "__main__":
-    parse_api_modifier_trade_ids()
-    parse_api_statics()
+    args = argparse.ArgumentParser(description="Generates the renderer data from the exported game files")
+    args.add_argument("--languages", nargs="+", choices=LANGUAGES.values(), default=["en"], help="codes of the languages to parse, only English by default")
+    args.add_argument("--jobs", "-j", type=int, default=1, help="number of languages to parse in parallel")
+    args.add_argument("--no-cache", action="store_true", help="ignore the .cache directory and parse every file again")
+    args.add_argument("--incremental", action="store_true", help="only rewrite output files that changed and write a changelog")
+    args.add_argument("--profile", action="store_true", help="record time, memory and record counts per stage to profile_<lang>.json")
+    args.add_argument("--fetch", action="store_true", help="refresh api_stats.json, api_items.json and api_static.json from the trade api first")
+    args.add_argument("--api-url", default=fetch.BASE_URL, help="base url of the trade api for --fetch")
+    args.add_argument("--binary", action="store_true", help="also write stats.bin and items.bin, a compact binary form of the ndjson files")
+    args.add_argument("--search-index", action="store_true", help="also write stats-trigram.index.bin, a trigram index over all matcher forms for fuzzy lookups")
+    args.add_argument("--validate", action="store_true", help="check the generated data against the renderer afterwards (see validate.py), exits with 1 on errors")
+    args.add_argument("--watch", action="store_true", help="stay running and regenerate the data whenever descriptions/, tables/ or the trade api data change")
+    args.add_argument("--interval", type=float, default=watch.INTERVAL, help="seconds between checks for changed files in --watch mode")
+    args.add_argument("--dump", action="store_true", help="also write the parsed items and mods to items_dump_<lang>.json and mods_dump_<lang>.json")
+    args = args.parse_args()
+    
+    languages = {}
     for (lang, code) in LANGUAGES.items():
-        print(f"Starting parser for {lang}")
-        parser = Parser(CWD, lang, code, TRANSLATION_FILES, modifier_trade_ids, TRADE_API_ITEMS, item_trade_statics)
-        parser.parse()
\ No newline at end of file
+        if code not in args.languages:
+            continue
+        if os.path.isdir(f"{CWD}/tables/{lang}"):
+            languages[lang] = code
+        else:
+            print(f"Skipping {lang}, no tables found")
+    if not languages:
+        sys.exit(f"Nothing to parse, no tables found for {', '.join(args.languages)} in {CWD}/tables")
+    
+    if args.fetch:
+        fetch.refresh(CWD, args.api_url)
+    
+    init_worker(load_shared(CWD, languages, None if args.no_cache else f"{CWD}/.cache"))
+    SHARED["incremental"] = args.incremental or args.watch # watch mode only rewrites what changed
+    SHARED["profile"] = args.profile
+    SHARED["dump"] = args.dump
+    SHARED["binary_output"] = args.binary
+    SHARED["search_index"] = args.search_index
+    
+    if args.watch:
+        watch_languages(languages, None if args.no_cache else f"{CWD}/.cache", args.validate, args.interval)
+        sys.exit(0)
+    
+    if args.jobs > 1 and len(languages) > 1:
+        # workers get the shared inputs once through the initializer instead of with every task
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(languages)), initializer=init_worker, initargs=(SHARED,)) as pool:
+            tasks = [pool.submit(run_parser, lang, code) for (lang, code) in languages.items()]
+            for task in as_completed(tasks):
+                print(f"Finished parser for {task.result()}")
+    else:
+        for (lang, code) in languages.items():
+            run_parser(lang, code)
+    
+    if args.validate and not validate.validate_all(CWD, list(languages.values())):
+        sys.exit(1)
@@ -0,0 +1,142 @@
+"""Writing the generated files, either unconditionally or only when their content changed"""
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+from index import js_length
+
+
+MANIFEST = "manifest.json"
+# the files the renderer fetches with their hash (renderer/src/assets/data/index.ts), the ones that exist go into the manifest
+MANIFEST_FILES = ("items.ndjson", "items-name.index.bin", "items-ref.index.bin",
+                  "stats.ndjson", "stats-ref.index.bin", "stats-matcher.index.bin", "stats-alias.ndjson", "stats-alias.index.bin")
+
+
+def dumps(record) -> str:
+    """Canonical json of a record: sorted keys, no whitespace and unescaped unicode, the same as JSON.stringify
+    Identical records always give identical lines, and the renderer can search the lines for JSON.stringify'd values
+    """
+    return json.dumps(record, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def read_file(path: str) -> bytes:
+    """Content of path, None if it doesn't exist"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def replacing(path: str):
+    """Yields a temporary path next to path and renames it to path once the block is done
+    Readers never see a partial file, and path is left alone if the block fails
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp) # left over from a crashed run
+    try:
+        yield tmp
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def write_file(path: str, data: bytes) -> None:
+    with replacing(path) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(data)
+
+
+class NdjsonWriter:
+    """Streams ndjson lines into a temporary file next to path
+    Lines are written in large batches and hashed on the way, the start of every
+    line is tracked for the indexes. commit() moves the file into place, discard() drops it.
+    """
+    BATCH_SIZE = 1 << 20 # characters
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        self.f = open(self.tmp, "wb")
+        self.hash = hashlib.sha1()
+        self.batch = []
+        self.batch_size = 0
+        self.offset = 0
+
+    def write(self, line: str) -> int:
+        """Adds a single line (without the newline), returns its start"""
+        start = self.offset
+        self.batch.append(line)
+        self.batch_size += len(line)
+        self.offset += js_length(line) + 1
+        if self.batch_size >= self.BATCH_SIZE:
+            self.flush()
+        return start
+
+    def flush(self) -> None:
+        if self.batch:
+            data = ("\n".join(self.batch) + "\n").encode("utf-8")
+            self.hash.update(data)
+            self.f.write(data)
+            self.batch = []
+            self.batch_size = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.f.close()
+
+    def commit(self) -> None:
+        os.replace(self.tmp, self.path)
+
+    def discard(self) -> None:
+        os.remove(self.tmp)
+
+
+def read_ndjson(path: str) -> dict:
+    """lineStart (utf-16 code units, as in the indexes) -> record"""
+    records = {}
+    start = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            records[start] = json.loads(line)
+            start += js_length(line) + 1
+    return records
+
+
+def group_ndjson(data: bytes, key) -> dict:
+    """key(record) -> list of records, in file order"""
+    groups = {}
+    # only "\n" ends a record, splitlines() would also split on U+2028 and the like inside the strings
+    for line in data.decode("utf-8").split("\n"):
+        if line:
+            record = json.loads(line)
+            groups.setdefault(key(record), []).append(record)
+    return groups
+
+
+def diff_ndjson(old: bytes, new: bytes, key) -> dict:
+    """Keys of the records that were added, removed or changed between two ndjson files"""
+    old = group_ndjson(old or b"", key)
+    new = group_ndjson(new, key)
+    return {
+        "added": [k for k in new if k not in old],
+        "removed": [k for k in old if k not in new],
+        "changed": [k for k in new if k in old and new[k] != old[k]]
+    }
+
+
+def stat_key(stat: dict) -> str:
+    return stat.get("id") or stat.get("ref")
+
+
+def item_key(item: dict) -> str:
+    return f"{item.get('namespace')}::{item.get('refName')}"
+
+
+def alias_key(alias: dict) -> str:
+    return alias.get("string")
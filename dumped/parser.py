@@ -1,9 +1,24 @@
 import os
 import re
 import json
-import hashlib
+import itertools
+from dataclasses import asdict
+from functools import lru_cache
+from index import HashIndex
+from records import Matcher, Translation, Mod, Item
+from descriptions import ENGLISH, iter_descriptions
+from cache import Cache, file_hash
+from tables import Table, Tables, load_config
+from profiler import Profiler
+import output
+import binary
+from search import TrigramIndex
+
+PARSER_VERSION = "4" # bump whenever a change alters what ends up in the cache
 
 NUMBER_PATTERN = re.compile(r'{\d+}')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+STATS_KEY_COLUMNS = ("StatsKey1", "StatsKey2", "StatsKey3", "StatsKey4")
 
 
 class StringUtils:
@@ -13,43 +28,40 @@ class StringUtils:
         Example: "Adds {0} to {1} [Lightning|Lightning] Damage": "Adds {0} to {1} Lightning Damage"
         Example: "Fügt {0} bis {1} [Lightning|Blitz]schaden hinzu": "Fügt {0} bis {1} Blitzschaden hinzu"
         """
-        if len(modifier) == 0:
+        if "[" not in modifier:
             return modifier
         
-        open_square_bracket = modifier.find("[")
-        close_square_bracket = modifier.find("]")
-        
-        while open_square_bracket >= 0 and close_square_bracket > 0:
-            # resolve brackets, this can be either the plain text or a key|value pair
-            key = modifier[open_square_bracket + 1:close_square_bracket]
-
+        # single pass over the brackets, every part after a [ starts with "key]" or "key|value]"
+        parts = modifier.split("[")
+        out = [parts[0]]
+        for part in parts[1:]:
+            (key, close, rest) = part.partition("]")
+            if not close:
+                out.append("[" + part)
+                continue
+            
             if "|" in key: # key|value pair
                 key = key.split("|")[1] # use value
-            modifier = modifier[:open_square_bracket] + key + modifier[close_square_bracket + 1:]
-                
-            open_square_bracket = modifier.find("[")
-            close_square_bracket = modifier.find("]")
+            out.append(key)
+            out.append(rest)
             
-        return modifier
+        return "".join(out)
     
     @staticmethod
     def convert_number_placeholder_in_modifier(modifier: str) -> str:
         """Converts all number placeholders in a stat string to #."""
-        if len(modifier) == 0:
+        if "{" not in modifier:
             return modifier
         
-        # replace all {0-9} with #
-        for match in NUMBER_PATTERN.findall(modifier):
-            modifier = modifier.replace(match, "#")
-            
-        # replace {0:+d} with +# (for example: +1)
-        modifier = modifier.replace("{0:+d}", "+#")
-
-        return modifier
+        # replace all {0-9} with # and {0:+d} with +# (for example: +1)
+        return NUMBER_PATTERN.sub("#", modifier).replace("{0:+d}", "+#")
     
     @staticmethod
+    @lru_cache(maxsize=1 << 16)
     def convert_stat_name(modifier: str) -> str:
-        """Converts a stat name to a readable format"""
+        """Converts a stat name to a readable format
+        Runs for every translation string and every trade api entry, so results are memoized
+        """
         modifier = modifier.strip()
         modifier = StringUtils.convert_translations_in_modifier(modifier)
         modifier = StringUtils.convert_number_placeholder_in_modifier(modifier)
@@ -63,6 +75,61 @@ class StringUtils:
         return modifier
 
 
+class TradeStatIndex:
+    """Resolves stat translations to trade ids
+    Built once from the parsed trade api stats, the results are memoized per set of matchers
+    """
+    # lower comes first, the form the trade api uses is the most likely to hit
+    MATCHER_PRIORITY = {"lang": 0, "matcher": 1, "not_so_raw": 2, "not_so_raw_2": 3, "raw": 4}
+    
+    def __init__(self, modifier_trade_ids: dict, normalized: dict = None):
+        self.exact = modifier_trade_ids # trade api text -> trade type -> trade ids
+        self.normalized = normalized    # normalized trade api text -> trade type -> trade ids
+        if normalized == None:
+            self.normalized = {}
+            for (text, ids) in modifier_trade_ids.items():
+                if text == None:
+                    # trade api entries without a text, tradedb.build skips them the same way
+                    continue
+                self.normalized.setdefault(self.normalize(text), ids)
+        self.by_matchers = {}           # ((matcher string, type), ...) -> trade type -> trade ids
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Canonical form used to compare translations with the trade api texts
+        Example: "{0:+d} to  [Strength|Strength]": "# to Strength"
+        """
+        text = StringUtils.convert_stat_name(text)
+        if text == None:
+            return None
+        return WHITESPACE_PATTERN.sub(" ", text).replace("+#", "#")
+    
+    def find(self, matchers: list) -> dict:
+        """Trade ids of the first matcher that hits, exact hits win over normalized ones"""
+        matchers = sorted(matchers, key=lambda matcher: self.MATCHER_PRIORITY.get(matcher.type, len(self.MATCHER_PRIORITY)))
+        for matcher in matchers:
+            ids = self.exact.get(matcher.string)
+            if ids != None:
+                return ids
+        for matcher in matchers:
+            ids = self.normalized.get(self.normalize(matcher.string))
+            if ids != None:
+                return ids
+        return {}
+    
+    def lookup(self, translation: Translation) -> dict:
+        """Trade ids for a translation, the same matchers are only resolved once
+        The memo is keyed by the matchers and not by the stat ids: the index is shared by the parsers
+        of every language, and a description whose text changed has to be resolved again
+        """
+        matchers = translation.trade_matchers if translation.trade_matchers != None else translation.matchers
+        key = tuple((matcher.string, matcher.type) for matcher in matchers)
+        ids = self.by_matchers.get(key)
+        if ids == None:
+            ids = self.by_matchers[key] = self.find(matchers)
+        return ids
+
+
 class Parser:
     lang: str # Language name
     langCode: str # Language code
@@ -70,24 +137,18 @@ class Parser:
     base_dir: str # Base directory for the dumped data
     output_dir: str # Output directory for the parsed data
     
-    mod_translations: dict      = {} # Translations for mods
-    base_items: dict            = {} # Base items
-    item_classes: dict          = {} # Item classes
-    item_class_categories: dict = {} # Item class categories
-    armour_types: dict          = {} # Armour types
-    weapon_types: dict          = {} # Weapon types
-    skill_gems: dict            = {} # Skill gems
-    skill_gem_info: dict        = {} # Skill gem info
-    stats_file: dict            = {} # Stats file - modifiers
-    mods_file: dict             = {} # Mods file - modifiers
-    modifiers: dict             = {} # Stats
-    mods: dict                  = {} # Mods
-    parsed_item_class_categories: dict = {} # Parsed item class categories
-    parsed_item_classes: dict   = {} # Parsed item classes
-    unique_items: list          = [] # Parsed unique items from the poe trade2 api
-    items: dict                 = {} # Parsed items
+    # everything below is per instance, see reset()
+    translation_fragments: dict         # description file -> (stat id, ...) -> Translation of that file
+    mod_translations: dict              # (stat id, ...) of a description -> Translation
+    translations_by_stat: dict          # stat id -> every mod_translations key containing it
+    resolved_stats: dict                # (stat id, ...) of a mod -> mod_translations keys covering them
+    mods: dict                          # (stat id, ...) of a description -> Mod
+    parsed_item_class_categories: dict  # ItemClassCategories index -> id
+    parsed_item_classes: dict           # ItemClasses index -> {name, short}
+    unique_items: list                  # Items for the uniques from the poe trade2 api
+    items: dict                         # BaseItemTypes index -> Item
     
-    def __init__(self, cwd: str, lang: str, langCode: str, translation_files: list, trade_api_modifiers: dict, trade_api_items: dict, item_trade_statics: dict):
+    def __init__(self, cwd: str, lang: str, langCode: str, translation_files: list, trade_api_modifiers: dict, trade_api_items: dict, item_trade_statics: dict, stat_keys: dict = None, mods_table: Table = None, cache: Cache = None, incremental: bool = False, profiler: Profiler = None, dump: bool = False, binary_output: bool = False, search_index: bool = False, languages: list = None):
         self.lang       = lang
         self.langCode   = langCode
         self.cwd        = cwd
@@ -96,40 +157,63 @@ class Parser:
         self.out_dir                = self.cwd + f"/../renderer/public/data/{self.langCode}/"
             
         self.TRANSLATION_FILES      = translation_files
-        self.TRADE_API_MODIFIERS    = trade_api_modifiers
+        self.TRADE_API_MODIFIERS    = trade_api_modifiers if isinstance(trade_api_modifiers, TradeStatIndex) else TradeStatIndex(trade_api_modifiers)
         self.TRADE_API_ITEMS        = trade_api_items
         self.TRADE_API_ITEM_STATICS = item_trade_statics
+        self.cache                  = cache if cache != None else Cache(None, PARSER_VERSION)
+        self.incremental            = incremental # only rewrite files whose content changed
+        self.profiler               = profiler if profiler != None else Profiler()
+        self.dump                   = dump # write items_dump_<lang>.json and mods_dump_<lang>.json for debugging
+        self.binary_output          = binary_output # also write stats.bin and items.bin, see binary.py
+        self.search_index           = search_index # also write stats-trigram.index.bin, see search.py
+        # languages read from the description files, the same for every parser of a run so they share the cache entries
+        self.languages              = sorted({ENGLISH, self.lang, *(languages or [])})
         
-        self.base_items             = self.load_file("BaseItemTypes")
-        self.item_classes           = self.load_file("ItemClasses")
-        self.item_class_categories  = self.load_file("ItemClassCategories")
-        self.armour_types           = self.load_file("ArmourTypes")
-        self.weapon_types           = self.load_file("WeaponTypes")
-        self.skill_gems             = self.load_file("SkillGems")
-        self.skill_gem_info         = self.load_file("SkillGemInfo")
-        self.stats_file             = self.load_file("Stats")
-        self.mods_file              = self.load_file("Mods")
-        
-    def load_file(self, file: str) -> dict:
-        """Loads a file from the base directory"""
-        return json.loads(open(f"{self.base_dir}/{file}.json").read())
+        # tables are only read when a stage first needs them
+        self.tables                 = Tables(self.base_dir, load_config(), self.cache, self.profiler)
+        # stat keys and mods don't depend on the language, they can be shared between parsers
+        self.modifiers              = stat_keys
+        if mods_table != None:
+            self.tables.loaded["Mods"] = mods_table
+        
+        self.reset()
+        
+    def reset(self) -> None:
+        """Drops all parsed data, the loaded tables are kept so the parser can be run again"""
+        self.translation_fragments          = {}
+        self.mod_translations               = {}
+        self.translations_by_stat           = {}
+        self.resolved_stats                 = {}
+        self.mods                           = {}
+        self.parsed_item_class_categories   = {}
+        self.parsed_item_classes            = {}
+        self.unique_items                   = []
+        self.items                          = {}
+        self.changes                        = {} # file -> added/removed/changed keys, only in incremental mode
+        
+    @staticmethod
+    def load_stat_keys(stats: Table) -> dict:
+        """Maps the Stats row index to the stat id"""
+        return dict(stats.rows("_index", "Id"))
     
-    def parse_modifier(self, id: str, strings: list):
-        """Parses the given modifier"""
+    def parse_modifier(self, strings: list) -> Translation:
+        """Parses the translation strings of a single description block"""
         matchers = []
         seen = set()
+        canonical = set()   # one matcher per translation string
+        aliases = {}        # every other variant -> the canonical matcher of its translation string
         
         def add_matcher(matcher: str, negate: bool, type: str) -> None:
             if matcher not in seen:
                 seen.add(matcher)
-                matchers.append({
-                    "string": matcher,
-                    "negate": negate,
-                    "type": type
-                })
+                matchers.append(Matcher(matcher, negate, type))
+            if type == "matcher":
+                canonical.add(matcher)
+            else:
+                aliases.setdefault(matcher, canonical_matcher)
         
         if len(strings) == 0:
-            return
+            return None
         
         ref = None
         for raw in strings:
@@ -152,6 +236,7 @@ class Parser:
             # the issue is, i dont know typescript
             # so i have to do all possible modifier combinations in python
 
+            canonical_matcher = matcher
             add_matcher(matcher, has_negate, "matcher")
             add_matcher(lang, has_negate, "lang")
                         
@@ -172,116 +257,136 @@ class Parser:
             if ref == None:
                 ref = lang
             
-        id = id.split(" ")
+        return Translation(ref, matchers, {alias: matcher for (alias, matcher) in aliases.items() if alias not in canonical})
+    
+    def read_translation_file(self, dir: str) -> dict:
+        """Reads the translations of self.languages in the file at once, the lang blocks of every other language are skipped
+        Returns language -> (stat id, ...) -> Translation, languages missing from the file fall back to English
+        """
+        print("Parsing", dir)
         
-        for a in id:
-            self.mod_translations[a] = {
-                "ref": ref,
-                "matchers": matchers,
-            }
+        # the english block always comes first, a block in the language itself only replaces its matchers:
+        # the ref stays english (the renderer looks stats up by it) and the trade ids are resolved from
+        # the english text, the trade api stats are english
+        fragments = {lang: {} for lang in self.languages}
+        english = {}
+        for (stat_ids, strings, language) in iter_descriptions(dir):
+            if language not in fragments:
+                continue
+            translation = self.parse_modifier(strings)
+            if translation == None:
+                continue
+            if language == ENGLISH:
+                english[stat_ids] = translation
+                for fragment in fragments.values():
+                    fragment[stat_ids] = translation
+            else:
+                base = english.get(stat_ids, translation)
+                fragments[language][stat_ids] = Translation(base.ref, translation.matchers, translation.aliases, base.matchers)
+        return fragments
     
     def parse_translation_file(self, file: str) -> None:
         """Parses the given translation file"""
-        dir = f"{self.cwd}/descriptions/{file}"
-        
-        print("Parsing", dir)
+        with self.profiler.stage(file, "descriptions") as stage:
+            fragments = self.cache.load("descriptions", f"{self.cwd}/descriptions/{file}", self.read_translation_file, ",".join(self.languages))
+            fragment = self.translation_fragments[file] = fragments[self.lang]
+            self.mod_translations.update(fragment)
+            stage["records"] = len(fragment)
+
+    def index_translations(self) -> None:
+        """Indexes the description keys by every stat they contain"""
+        for stat_ids in self.mod_translations:
+            for stat_id in stat_ids:
+                self.translations_by_stat.setdefault(stat_id, []).append(stat_ids)
+    
+    def resolve_stats(self, stat_ids: tuple) -> list:
+        """Finds the descriptions that translate the given stats of a mod
+        A description covering several of the stats (a hybrid stat) is preferred over single ones,
+        if multiple descriptions fit equally well the last one parsed wins
+        """
+        keys = self.resolved_stats.get(stat_ids)
+        if keys != None:
+            return keys
         
-        modifier_translations = open(dir, encoding="utf-16").read().split("\n")
+        keys = []
+        covered = set()
+        for stat_id in stat_ids:
+            if stat_id in covered:
+                continue
+            
+            candidates = self.translations_by_stat.get(stat_id)
+            if candidates == None:
+                continue
+            
+            best = None
+            for key in candidates:
+                if all(a in stat_ids for a in key) and (best == None or len(key) >= len(best)):
+                    best = key
+            if best == None:
+                # no description fits the mod completely, use the one for this stat
+                best = candidates[-1]
+            
+            keys.append(best)
+            covered.update(best)
         
-        for i in range(0, len(modifier_translations)):
-            line = modifier_translations[i]
-
-            if line == "description":
-                # start of the translation block
-                id = modifier_translations[i + 1].strip()[2:].replace('"', "") # skip first 2 characters
-                amt_stat_translations = modifier_translations[i + 2].strip()
-                
-                strings = []
-                for j in range(0, int(amt_stat_translations)):
-                    translation_string = modifier_translations[i + 3 + j].strip() # skip first 2 characters
-                    start = translation_string.find('"')
-                    end = translation_string.rfind('"')
-                    translation_string = translation_string[start + 1: end] # remove quotes
-                    
-                    if "negate" in translation_string:
-                        # mod has a negated version
-                        end = translation_string.find('negate')
-                        translation_string = translation_string[translation_string.find('"') + 1:end + len('negate')] # remove quotes and negate
-                        
-                    strings.append(translation_string)
-                        
-                self.parse_modifier(id, strings)
-
+        self.resolved_stats[stat_ids] = keys
+        return keys
+    
     def parse_mods(self) -> None:
         """Parses the mods file"""
         
-        for stat in self.stats_file:
-            id = stat.get("_index")
-            name = stat.get("Id")
-            self.modifiers[id] = name   
-        
         # translations
         for file in self.TRANSLATION_FILES:
-            if os.path.isdir(f"{self.cwd}/descriptions/{file}"):
-                # traverse directories if it doesnt start with _
-                if not file.startswith("_"):
-                    for _file in os.listdir(f"{self.cwd}/descriptions/{file}"):
-                        self.parse_translation_file(f"{file}/{_file}")
-            elif ".csd" in file:
-                self.parse_translation_file(file)
+            self.parse_translation_file(file)
+        self.derive_mods()
+    
+    def derive_mods(self) -> None:
+        """Builds self.mods from the parsed translations and the Mods table"""
+        self.index_translations()
+        
+        if self.modifiers == None:
+            self.modifiers = self.load_stat_keys(self.tables["Stats"])
+                
+        for keys in self.tables["Mods"].rows(*STATS_KEY_COLUMNS):
+            stat_ids = tuple(self.modifiers.get(key) for key in keys if key != None)
+            if len(stat_ids) == 0:
+                continue
+            
+            for key in self.resolve_stats(stat_ids):
+                if key in self.mods:
+                    # every tier of a mod shares the same stats
+                    continue
+                
+                translation = self.mod_translations[key]
+                trade_ids = self.TRADE_API_MODIFIERS.lookup(translation)
                 
-        for mod in self.mods_file:
-            id = mod.get("Id")
-            stats_key = mod.get("StatsKey1")
-            if stats_key != None:
-                stats_id = self.modifiers.get(stats_key)
-                translation = self.mod_translations.get(stats_id)
-                if translation:
-                    ref = translation.get("ref")
-                    matchers = translation.get("matchers")
+                # if len(trade_ids) == 0:
+                    # print("No trade ids found for", translation.matchers[0].string)
                     
-                    trade_ids = {}
-                    for matcher in matchers:
-                        search = matcher.get("string")
-                        ids = self.TRADE_API_MODIFIERS.get(search)
-                        if ids != None:
-                            trade_ids = ids
-                            
-                    # if len(trade_ids) == 0:
-                        # print("No trade ids found for", matchers[0].get("string"))
-                        
-                    self.mods[stats_id] = {
-                        "ref": ref,
-                        "better": 1,
-                        "id": stats_id,
-                        "matchers": translation.get("matchers"),
-                        "trade": {"ids": trade_ids}
-                    }
+                self.mods[key] = Mod(" ".join(key), translation.ref, translation.matchers, trade_ids, aliases=translation.aliases)
 
     def parse_categories(self) -> None:
         """Parses the item categories"""
         
-        for cat in self.item_class_categories:
-            id = cat.get("_index")
+        for (id, text) in self.tables["ItemClassCategories"].rows("_index", "Id"):
             if id == None:
                 continue
             
-            text = cat.get("Id")
             self.parsed_item_class_categories[id] = text    
 
-        for cat in self.item_classes:
-            id = cat.get("_index")
+        for (id, text, category) in self.tables["ItemClasses"].rows("_index", "Id", "ItemClassCategory"):
             if id == None:
                 continue
             
-            text = cat.get("Id")
             self.parsed_item_classes[id] = {
                 "name": text,
-                "short": self.parsed_item_class_categories.get(cat.get("ItemClassCategory"))
+                "short": self.parsed_item_class_categories.get(category)
             }    
 
-    def parse_items(self) -> None:
-        """Parses all base items including uniques"""
+    def join_items(self) -> None:
+        """Builds every item record, including uniques, in a single pass over the base items
+        Gem, weapon and armour rows are indexed by their BaseItemTypesKey beforehand
+        """
         
         # NOTE: Unique items aren't translated into the correct language
         for entry in self.TRADE_API_ITEMS["result"]:
@@ -291,200 +396,276 @@ class Parser:
                     continue
                 type = item.get("type")
                 
-                self.unique_items.append({
-                    "name": name,
-                    "refName": name,
-                    "namespace": "UNIQUE",
-                    "unique": {
-                        "base": type
-                    }
-                })
+                self.unique_items.append(Item(name, "UNIQUE", unique={"base": type}))
 
-        # parse base items
-        for item in self.base_items:
-            id = item.get("_index")
+        # foreign key indexes, BaseItemTypesKey -> row
+        gems = set(self.tables["SkillGems"].column("BaseItemTypesKey"))
+        weapons = set(self.tables["WeaponTypes"].column("BaseItemTypesKey"))
+        armours = {id: armour for (id, *armour) in self.tables["ArmourTypes"].rows("BaseItemTypesKey", "ArmourMin", "ArmourMax", "EvasionMin", "EvasionMax", "EnergyShieldMin", "EnergyShieldMax")}
+        class_names = dict(self.tables["ItemClasses"].rows("_index", "Name"))
+
+        for (id, name, class_key, drop_level) in self.tables["BaseItemTypes"].rows("_index", "Name", "ItemClassesKey", "DropLevel"):
             if id == None:
                 continue
             
-            name = item.get("Name")
-            
             if len(name) == 0:
                 continue
             
-            class_key = item.get("ItemClassesKey")
+            item = self.items[id] = Item(name, "ITEM", class_key, drop_level, "%NOT_FOUND%")
             
-            self.items[id] = {
-                "name": name,
-                "refName": name,
-                "namespace": "ITEM",
-                "class": class_key,
-                "dropLevel": item.get("DropLevel"),
-                "icon": "%NOT_FOUND%"
-            }
+            trade_tag = self.TRADE_API_ITEM_STATICS.get(name)
+            if trade_tag != None:
+                item.trade_tag = trade_tag.get("tradeTag")
+                item.icon = trade_tag.get("icon")
             
             class_info = self.parsed_item_classes.get(class_key)
             
             if class_info != None:
+                item.class_name = class_names.get(class_key)
+                item.category = class_info
                 class_info = class_info.get("short")
                 
-                if "flask" in name.lower():
-                    class_info = "Flask"
-                
-                # if class_info in ["Belt", "Ring", "Amulet"]:
-                if class_info != None:
-                    self.items[id].update({
-                        "craftable": {
+                # weapons and armor need the craftable tag ("craftable": "type (helmet, boots etc)")
+                if id in weapons:
+                    item.craftable = {
+                        "category": class_info
+                    }
+                else:
+                    if "flask" in name.lower():
+                        class_info = "Flask"
+                    
+                    # if class_info in ["Belt", "Ring", "Amulet"]:
+                    if class_info != None:
+                        item.craftable = {
                             "category": class_info
                         }
-                    })
             else:
                 print("No class info found for", name)
-        # convert base items into gems
-        for gem in self.skill_gems:
-            id = gem.get("BaseItemTypesKey")
-            if id in self.items:
-                self.items[id].update({
-                    "namespace": "GEM",
-                    "gem": {
-                        "awakened": False,
-                        "transfigured": False
-                    }
-                })
             
-        # weapons and armor need the craftable tag ("craftable": "type (helmet, boots etc)")
-        # convert base items into weapons
-        for wpn in self.weapon_types:
-            id = wpn.get("BaseItemTypesKey")
-            
-            if id in self.items:
-                class_key = self.items[id].get("class")
-                self.items[id].update({
-                    "craftable": {
-                        "category": self.parsed_item_classes.get(class_key).get("short"),
-                    }
-                })
-
-        # convert base items into armor types
-        # armour needs the armour tag ("armour": "ar": [min, max], "ev": [min, max], "es": [min, max])
-        for armour in self.armour_types:
-            id = armour.get("BaseItemTypesKey")
-            
-            ar = [armour.get("ArmourMin"), armour.get("ArmourMax")]
-            ev = [armour.get("EvasionMin"), armour.get("EvasionMax")]
-            es = [armour.get("EnergyShieldMin"), armour.get("EnergyShieldMax")]
-            
-            armour = {}
-            
-            if ar[1] > 1:
-                armour["ar"] = ar
-            
-            if ev[1] > 1:
-                armour["ev"] = ev
-            
-            if es[1] > 1:
-                armour["es"] = es
-            
-            if id in self.items:
-                self.items[id].update({ 
-                    "armour": armour
-                })
-
-    def resolve_item_classes(self) -> None:
-        """Resolves the item classes and their categories"""
-        
-        for item_class in self.item_classes:
-            id = item_class.get("_index")
-            if id == None:
-                continue
-            
-            name = item_class.get("Name")
-            item_class_category = item_class.get("ItemClassCategory")
-            
-            if id in self.items:
-                self.items[id].update({
-                    "class": name,
-                    "category": self.parsed_item_classes.get(item_class_category)
-                })
+            if id in gems:
+                item.namespace = "GEM"
+                item.gem = {
+                    "awakened": False,
+                    "transfigured": False
+                }
+            
+            # armour needs the armour tag ("armour": "ar": [min, max], "ev": [min, max], "es": [min, max])
+            armour = armours.get(id)
+            if armour != None:
+                (ar_min, ar_max, ev_min, ev_max, es_min, es_max) = armour
+                item.armour = {key: [min, max] for (key, min, max) in (("ar", ar_min, ar_max), ("ev", ev_min, ev_max), ("es", es_min, es_max)) if max > 1}
 
     def write_items_to_file(self) -> None: 
-        """Writes all items to the items.ndjson file"""
-        f = open(f"{self.out_dir}/items.ndjson", "w", encoding="utf-8")
-        for item in self.items.values():
-            name = item.get("name")
-            namespace = item.get("namespace", "ITEM")
-            craftable = item.get("craftable", None)
-            gem = item.get("gem", None)
-            armour = item.get("armour", None)
-            icon = item.get("icon", None)
-            
-            trade_tag = self.TRADE_API_ITEM_STATICS.get(name)
-            
-            out = {
-                "name": name,
-                "refName": name,
-                "namespace": namespace, 
-                "icon": icon
-            }
-            
-            if trade_tag != None:
-                # print("Trade tag found for", name)
-                out.update({
-                    "tradeTag": trade_tag.get("tradeTag"),
-                    "icon": trade_tag.get("icon")
-                })
-            
-            if craftable:
-                out.update({
-                    "craftable": craftable
-                })
+        """Writes all items to the items.ndjson file along with the name/refName indexes"""
+        # records sharing namespace::refName have to be consecutive,
+        # the renderer reads forward from the indexed line to collect all of them
+        groups = {} # namespace::refName -> [namespace::name, records]
+        for item in itertools.chain(self.items.values(), self.unique_items):
+            group = groups.get(f"{item.namespace}::{item.ref_name}")
+            if group == None:
+                group = groups[f"{item.namespace}::{item.ref_name}"] = [f"{item.namespace}::{item.name}", []]
+            group[1].append(item.to_dict())
+            
+        index_names = HashIndex("items-name")
+        index_ref_names = HashIndex("items-ref")
+        items_bin = binary.ItemsWriter() if self.binary_output else None
+        f = output.NdjsonWriter(f"{self.out_dir}/items.ndjson")
+        # sorted by key, so the line starts only depend on the records and not on the table order
+        for (key, (name, records)) in sorted(groups.items()):
+            start = f.write(output.dumps(records[0]))
+            for record in records[1:]:
+                f.write(output.dumps(record))
                 
-            if armour:
-                out.update({
-                    "armour": armour
-                })
-                
-            if gem:
-                out.update({
-                    "gem": gem
-                })
-            
-            f.write(json.dumps(out) + "\n")
-            
-        for item in self.unique_items:
-            f.write(json.dumps(item) + "\n")
-            
-        f.close()
+            index_names.add(name, start)
+            index_ref_names.add(key, start)
+            if items_bin != None:
+                items_bin.add_group(name, key, records)
+        
+        self.write_output(f, output.item_key, [index_names, index_ref_names])
+        if items_bin != None:
+            self.write_binary(f"{self.out_dir}/items.bin", items_bin.to_bytes())
+        else:
+            self.remove_output(f"{self.out_dir}/items.bin")
 
     def write_modifiers_to_file(self) -> None:
-        """Writes all modifiers to the stats.ndjson file"""
-        seen = set()
-        m = open(f"{self.out_dir}/stats.ndjson", "w", encoding="utf-8")
-        for mod in self.mods.values():
-            # compute hash of the mod
-            hash = hashlib.md5(json.dumps(mod).encode()).hexdigest()
-            if hash in seen:
+        """Writes all modifiers to the stats.ndjson file along with the ref/matcher indexes
+        Records only carry their canonical matchers, every other variant goes to stats-alias.ndjson
+        """
+        canonical = set()
+        aliases = {} # variant -> alias record, the first stat using a variant keeps it
+        index_ref = HashIndex("stats-ref")
+        index_matcher = HashIndex("stats-matcher")
+        stats_bin = binary.StatsWriter() if self.binary_output else None
+        trigrams = TrigramIndex() if self.search_index else None
+        m = output.NdjsonWriter(f"{self.out_dir}/stats.ndjson")
+        # mods are keyed by their stat ids, so every id is written once
+        for mod in sorted(self.mods.values(), key=lambda mod: mod.id):
+            record = mod.to_dict()
+            start = m.write(output.dumps(record))
+            
+            index_ref.add(mod.ref, start)
+            for matcher in record["matchers"]:
+                index_matcher.add(matcher["string"], start)
+                canonical.add(matcher["string"])
+            for matcher in mod.matchers:
+                if matcher.string in mod.aliases and matcher.string not in aliases:
+                    aliases[matcher.string] = {"string": matcher.string, "matcher": mod.aliases[matcher.string], "type": matcher.type}
+            if stats_bin != None:
+                stats_bin.add(record)
+            if trigrams != None:
+                trigrams.add([matcher.string for matcher in mod.matchers], start)
+        
+        self.write_output(m, output.stat_key, [index_ref, index_matcher])
+        if trigrams != None:
+            self.write_binary(f"{self.out_dir}/stats-trigram.index.bin", trigrams.to_bytes())
+        else:
+            self.remove_output(f"{self.out_dir}/stats-trigram.index.bin")
+        
+        # a variant that is the canonical matcher of another stat is found through stats-matcher already
+        index_alias = HashIndex("stats-alias")
+        a = output.NdjsonWriter(f"{self.out_dir}/stats-alias.ndjson")
+        for (string, alias) in sorted(aliases.items()):
+            if string in canonical:
                 continue
-            
-            m.write(json.dumps(mod) + "\n")
-            seen.add(hash)
-            
-        m.close()
+            index_alias.add(string, a.write(output.dumps(alias)))
+            if stats_bin != None:
+                stats_bin.add_alias(alias)
+        
+        self.write_output(a, output.alias_key, [index_alias])
+        if stats_bin != None:
+            self.write_binary(f"{self.out_dir}/stats.bin", stats_bin.to_bytes())
+        else:
+            self.remove_output(f"{self.out_dir}/stats.bin")
+        
+    def write_output(self, writer: output.NdjsonWriter, key, indexes: list) -> None:
+        """Moves a finished ndjson file into place and writes its indexes
+        In incremental mode unchanged files are left alone and the differences are recorded in self.changes
+        """
+        writer.close()
+        for index in indexes:
+            index.report()
+        
+        if self.incremental:
+            previous = file_hash(writer.path) if os.path.exists(writer.path) else None
+            unchanged = previous == writer.hash.hexdigest() and all(os.path.exists(f"{self.out_dir}/{index.name}.index.bin") for index in indexes)
+            if unchanged:
+                print("Unchanged", writer.path)
+                writer.discard()
+                return
+            self.changes[os.path.basename(writer.path)] = output.diff_ndjson(output.read_file(writer.path), output.read_file(writer.tmp), key)
+        
+        writer.commit()
+        for index in indexes:
+            output.write_file(f"{self.out_dir}/{index.name}.index.bin", index.to_bytes())
+        
+    def write_binary(self, path: str, data: bytes) -> None:
+        """Writes a generated binary file, in incremental mode only if it changed"""
+        if self.incremental and output.read_file(path) == data:
+            return
+        output.write_file(path, data)
+        
+    def remove_output(self, path: str) -> None:
+        """Removes a generated file of an option that is off, a file left from an earlier run would go stale next to the new output"""
+        if os.path.exists(path):
+            print("Removing", path)
+            os.remove(path)
+        
+    def write_manifest(self) -> None:
+        """Writes manifest.json, the content hash and size of every file the renderer fetches
+        Downloads and reindexing can be skipped for a file whose hash didn't change
+        """
+        files = {}
+        for name in output.MANIFEST_FILES:
+            path = f"{self.out_dir}/{name}"
+            if os.path.isfile(path):
+                files[name] = {"sha1": file_hash(path), "size": os.path.getsize(path)}
+        self.write_binary(f"{self.out_dir}/{output.MANIFEST}", output.dumps({"files": files}).encode("utf-8"))
         
     def write_to_file(self) -> None:
         self.write_items_to_file()
         self.write_modifiers_to_file()
+        self.write_manifest()
         
-        # data dumping
-        with open("items_dump.json", "w", encoding="utf-8") as f:
-            f.write(json.dumps(self.items, indent=4))
+        if self.incremental:
+            # machine readable changelog of this run, empty if nothing moved
+            with open(f"{self.cwd}/changes_{self.langCode}.json", "w", encoding="utf-8") as f:
+                f.write(json.dumps(self.changes, indent=4))
         
-        with open("mods_dump.json", "w", encoding="utf-8") as f:
-            f.write(json.dumps(self.mods, indent=4))
+        if self.dump:
+            # data dumping
+            with open(f"{self.cwd}/items_dump_{self.langCode}.json", "w", encoding="utf-8") as f:
+                f.write(json.dumps({id: asdict(item) for (id, item) in self.items.items()}, indent=4))
+            
+            with open(f"{self.cwd}/mods_dump_{self.langCode}.json", "w", encoding="utf-8") as f:
+                f.write(json.dumps({mod.id: asdict(mod) for mod in self.mods.values()}, indent=4))
 
+    def update(self, changed: list, translation_files: list = None, stat_keys: dict = None, mods_table: Table = None) -> None:
+        """Re-parses only what the changed files (relative to cwd) affect and writes the output again
+        Everything else is kept from the previous parse(), used by watch mode
+        translation_files replaces TRANSLATION_FILES when description files were added or removed
+        stat_keys and mods_table replace the shared copies when the Stats or Mods table of any language changed
+        """
+        if translation_files != None:
+            self.TRANSLATION_FILES = translation_files
+        descriptions = {file[len("descriptions/"):] for file in changed if file.startswith("descriptions/")}
+        tables = {os.path.splitext(os.path.basename(file))[0] for file in changed if file.startswith(f"tables/{self.lang}/")}
+        tables &= set(self.tables.config)
+        if not descriptions and not tables and stat_keys == None and mods_table == None:
+            return
+        
+        for name in tables:
+            self.tables.loaded.pop(name, None)
+        if "Stats" in tables:
+            self.modifiers = None
+        if stat_keys != None:
+            self.modifiers = stat_keys
+            tables.add("Stats")
+        if mods_table != None:
+            self.tables.loaded["Mods"] = mods_table
+            tables.add("Mods")
+        
+        with self.profiler.stage("update") as stage:
+            if descriptions or "Stats" in tables or "Mods" in tables:
+                # the files are merged again in their original order, so overrides resolve the same way as in parse()
+                self.mod_translations = {}
+                for file in self.TRANSLATION_FILES:
+                    if file in descriptions or file not in self.translation_fragments:
+                        self.parse_translation_file(file)
+                    else:
+                        self.mod_translations.update(self.translation_fragments[file])
+                for file in set(self.translation_fragments) - set(self.TRANSLATION_FILES):
+                    del self.translation_fragments[file]
+                
+                # the trade id memo of TRADE_API_MODIFIERS is keyed by the matchers, an edited description misses it
+                self.translations_by_stat = {}
+                self.resolved_stats = {}
+                self.mods = {}
+                self.derive_mods()
+            
+            if tables - {"Stats", "Mods"}:
+                self.parsed_item_class_categories = {}
+                self.parsed_item_classes = {}
+                self.unique_items = []
+                self.items = {}
+                self.parse_categories()
+                self.join_items()
+            
+            self.changes = {}
+            self.write_to_file()
+            stage["records"] = len(self.mods) + len(self.items) + len(self.unique_items)
+    
     def parse(self) -> None:
         """Parses all data"""
-        self.parse_mods()
-        self.parse_categories()
-        self.parse_items()
-        self.resolve_item_classes()
-        self.write_to_file()
\ No newline at end of file
+        self.reset()
+        with self.profiler.stage("parse_mods") as stage:
+            self.parse_mods()
+            stage["records"] = len(self.mods)
+        with self.profiler.stage("parse_categories") as stage:
+            self.parse_categories()
+            stage["records"] = len(self.parsed_item_classes)
+        with self.profiler.stage("join_items") as stage:
+            self.join_items()
+            stage["records"] = len(self.items) + len(self.unique_items)
+        with self.profiler.stage("write_to_file") as stage:
+            self.write_to_file()
+            stage["records"] = len(self.mods) + len(self.items) + len(self.unique_items)
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Per stage timing and memory instrumentation for the parser
+
+    with profiler.stage("parse_mods") as stage:
+        ...
+        stage["records"] = len(mods)
+
+Records wall time, cpu time and the peak of traced python memory for every
+stage. Stages can be nested, the peak of a stage includes its children.
+A disabled profiler only hands out a throwaway dict.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages = []    # finished stages, in the order they started
+        self.stack = []     # (stage, peak of the stage before its current child)
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, group: str = "stages"):
+        stage = {"name": name, "group": group}
+        if not self.enabled:
+            yield stage
+            return
+
+        self.enter_child()
+        self.stages.append(stage)
+        self.stack.append([stage, 0])
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield stage
+        finally:
+            stage["wall"] = time.perf_counter() - start_wall
+            stage["cpu"] = time.process_time() - start_cpu
+            (_, child_peak) = self.stack.pop()
+            stage["peak"] = max(tracemalloc.get_traced_memory()[1], child_peak)
+            if self.stack:
+                self.stack[-1][1] = max(self.stack[-1][1], stage["peak"])
+
+    def enter_child(self) -> None:
+        """Keeps the peak of the running stage, tracemalloc only has a single peak that is reset for the child"""
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    def to_dict(self) -> dict:
+        out = {}
+        for stage in self.stages:
+            out.setdefault(stage["group"], []).append({key: value for (key, value) in stage.items() if key != "group"})
+        if resource != None:
+            # kilobytes on linux, bytes on macos
+            out["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return out
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_dict(), indent=4))
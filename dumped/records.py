@@ -0,0 +1,97 @@
+"""Compact records for the parsed data
+
+Every parser keeps thousands of these around, so they use __slots__ instead of
+plain dicts. to_dict() returns the exact shape the renderer expects in the ndjson files.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class Matcher:
+    string: str
+    negate: bool
+    type: str
+
+    def to_dict(self) -> dict:
+        return {
+            "string": self.string,
+            "negate": self.negate,
+            "type": self.type
+        }
+
+
+@dataclass(slots=True)
+class Translation:
+    ref: str
+    matchers: list # list of Matcher, every variant of the translation string
+    aliases: dict = None # variant matcher string -> canonical matcher string of the same translation string
+    trade_matchers: list = None # matchers the trade ids are resolved from, the english ones for other languages, None is matchers
+
+
+@dataclass(slots=True)
+class Mod:
+    id: str
+    ref: str
+    matchers: list # list of Matcher
+    trade_ids: dict # trade type -> trade ids
+    better: int = 1
+    aliases: dict = None # variant matcher string -> canonical matcher string, written to stats-alias.ndjson
+
+    def to_dict(self) -> dict:
+        """Only the canonical matchers, the variants are looked up through the alias table"""
+        aliases = self.aliases or {}
+        return {
+            "ref": self.ref,
+            "better": self.better,
+            "id": self.id,
+            "matchers": [matcher.to_dict() for matcher in self.matchers if matcher.string not in aliases],
+            "trade": {"ids": self.trade_ids}
+        }
+
+
+@dataclass(slots=True)
+class Item:
+    name: str
+    namespace: str = "ITEM"
+    class_key: int = None
+    drop_level: int = None
+    icon: str = None
+    trade_tag: str = None
+    craftable: dict = None
+    armour: dict = None
+    gem: dict = None
+    unique: dict = None
+    # only kept for the debug dumps, not written to the ndjson files
+    class_name: str = None
+    category: dict = None
+
+    @property
+    def ref_name(self) -> str:
+        return self.name
+
+    def to_dict(self) -> dict:
+        out = {
+            "name": self.name,
+            "refName": self.ref_name,
+            "namespace": self.namespace
+        }
+
+        if self.icon != None:
+            out["icon"] = self.icon
+
+        if self.trade_tag != None:
+            out["tradeTag"] = self.trade_tag
+
+        if self.craftable:
+            out["craftable"] = self.craftable
+
+        if self.armour:
+            out["armour"] = self.armour
+
+        if self.gem:
+            out["gem"] = self.gem
+
+        if self.unique:
+            out["unique"] = self.unique
+
+        return out
@@ -0,0 +1,91 @@
+"""Trigram index over the stat matchers, for mod lines that don't hit a matcher exactly
+
+Every matcher form of a stat (canonical ones and aliases) is normalized the same
+way a clipboard line is: lowercased, numbers and signs folded into "#", brackets
+resolved and whitespace collapsed. The trigrams of the normalized text point at
+the line start of the stat in stats.ndjson. A near-miss line only has to look at
+the stats sharing most trigrams with it instead of scanning the whole file.
+
+stats-trigram.index.bin, little-endian u32 like the other indexes:
+
+    count
+    count x [fnv1a32(trigram), first posting, posting count]    sorted by hash
+    postings                                                    stats.ndjson line starts, ascending per trigram
+
+    python search.py <stats-trigram.index.bin> "<mod line>"     prints the best candidates
+"""
+import re
+import sys
+import struct
+from output import read_ndjson
+from index import fnv1a32
+
+NUMBER_PATTERN = re.compile(r"[+-]?([0-9]+(\.[0-9]+)?|#|\{[0-9]+(:[+-]?d)?\})")
+BRACKET_PATTERN = re.compile(r"\[([^\]|]*\|)?([^\]|]*)\]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+ENTRY = struct.Struct("<III")
+COUNT = struct.Struct("<I")
+
+
+def normalize(text: str) -> str:
+    """Example: "Adds 3 to 5 [Fire|Fire] Damage": "adds # to # fire damage"
+    """
+    text = BRACKET_PATTERN.sub(r"\2", text)
+    text = NUMBER_PATTERN.sub("#", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip().lower()
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of the normalized text, padded so short words and word starts count too"""
+    text = f"  {normalize(text)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.postings = {} # fnv1a32(trigram) -> line starts
+
+    def add(self, texts: list, start: int) -> None:
+        """Adds every form of a stat, the stat is listed once per trigram"""
+        hashes = set()
+        for text in texts:
+            hashes.update(fnv1a32(trigram) for trigram in trigrams(text))
+        for hash in hashes:
+            self.postings.setdefault(hash, []).append(start)
+
+    def to_bytes(self) -> bytes:
+        table = []
+        postings = []
+        for hash in sorted(self.postings):
+            starts = sorted(self.postings[hash])
+            table.append(ENTRY.pack(hash, len(postings), len(starts)))
+            postings.extend(starts)
+        return COUNT.pack(len(table)) + b"".join(table) + struct.pack(f"<{len(postings)}I", *postings)
+
+
+def query(data: bytes, text: str, limit: int = 10) -> list:
+    """[(score, line start)] of the stats sharing the most trigrams with text, best first
+    score is the share of the trigrams of text found in the stat
+    """
+    (count,) = COUNT.unpack_from(data, 0)
+    table = {hash: (first, size) for (hash, first, size) in ENTRY.iter_unpack(data[COUNT.size:COUNT.size + count * ENTRY.size])}
+    postings = COUNT.size + count * ENTRY.size
+    wanted = {fnv1a32(trigram) for trigram in trigrams(text)}
+    scores = {}
+    for hash in wanted:
+        entry = table.get(hash)
+        if entry == None:
+            continue
+        (first, size) = entry
+        for start in struct.unpack_from(f"<{size}I", data, postings + first * 4):
+            scores[start] = scores.get(start, 0) + 1
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [(score / len(wanted), start) for (start, score) in best]
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    stats = read_ndjson(sys.argv[1].replace("stats-trigram.index.bin", "stats.ndjson"))
+    for (score, start) in query(data, sys.argv[2]):
+        print(f"{score:.2f} {stats[start]['matchers'][0]['string']}")
@@ -0,0 +1,97 @@
+"""Column projected access to the tables exported by pathofexile-dat
+
+Only the columns listed for a table in config.json (plus _index) are kept,
+stored by column instead of as a list of dicts. Integer columns without
+missing values are packed into arrays. Tables are read on first use, and
+the projected form is what goes into the cache, so a cached table loads
+without parsing any json.
+
+    tables = Tables(f"{cwd}/tables/English", load_config())
+    for (id, name) in tables["BaseItemTypes"].rows("_index", "Name"):
+        ...
+"""
+import os
+import json
+from array import array
+from cache import Cache
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+INDEX_COLUMN = "_index"
+
+
+def load_config(path: str = CONFIG_PATH) -> dict:
+    """Table name -> exported columns, as configured for pathofexile-dat"""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return {table["name"]: [INDEX_COLUMN] + table["columns"] for table in config["tables"]}
+
+
+def compact(values: list):
+    """Integer columns without missing values go into an array, everything else stays a list"""
+    if values and all(type(value) is int for value in values):
+        try:
+            return array("q", values)
+        except OverflowError:
+            pass
+    return values
+
+
+class Table:
+    """A single exported table, stored by column"""
+    __slots__ = ("name", "columns", "size")
+
+    def __init__(self, name: str, columns: dict, size: int):
+        self.name = name
+        self.columns = columns  # column name -> list or array, all of the same size
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def column(self, name: str):
+        """All values of a column, missing columns are all None"""
+        values = self.columns.get(name)
+        return values if values != None else [None] * self.size
+
+    def rows(self, *names: str):
+        """Iterates over the given columns row by row, as tuples"""
+        return zip(*(self.column(name) for name in names))
+
+    @staticmethod
+    def read(name: str, path: str, columns: list) -> "Table":
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        return Table(name, {column: compact([row.get(column) for row in rows]) for column in columns}, len(rows))
+
+
+class Tables:
+    """The tables of one language, each one is loaded on first access"""
+
+    def __init__(self, dir: str, config: dict, cache: Cache = None, profiler=None):
+        self.dir = dir
+        self.config = config
+        self.cache = cache if cache != None else Cache(None, "")
+        self.profiler = profiler
+        self.loaded = {}
+
+    def __getitem__(self, name: str) -> Table:
+        table = self.loaded.get(name)
+        if table == None:
+            table = self.loaded[name] = self.load(name)
+        return table
+
+    def load(self, name: str) -> Table:
+        columns = self.config.get(name)
+        if columns == None:
+            raise KeyError(f"{name} is not exported, add it to config.json")
+
+        # the projection is part of the cache key, changing the columns in config.json misses
+        build = lambda path: Table.read(name, path, columns)
+        path = f"{self.dir}/{name}.json"
+        if self.profiler == None:
+            return self.cache.load("table", path, build, ",".join(columns))
+
+        with self.profiler.stage(name, group="tables") as stage:
+            table = self.cache.load("table", path, build, ",".join(columns))
+            stage["records"] = len(table)
+        return table
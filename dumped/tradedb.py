@@ -0,0 +1,223 @@
+"""Compiled trade api lookups: stat text -> trade ids and item name -> trade tag/icon
+
+The raw api_stats.json and api_static.json are normalized once into a read-only
+SQLite file, rebuilt only when either file or the parser version changes.
+Every run after that opens the file instead of running convert_stat_name over
+the whole trade stats catalog. Other tools can use it the same way:
+
+    python tradedb.py build
+    python tradedb.py query "+# to maximum Life"
+
+The objects handed to the parser only hold the path and open their own
+connection on first use, so they can be passed to worker processes.
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from parser import StringUtils, TradeStatIndex, PARSER_VERSION
+from cache import file_hash, read_json
+import output
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE stats (position INTEGER PRIMARY KEY, text TEXT NOT NULL, normalized TEXT NOT NULL, type TEXT, id TEXT);
+CREATE INDEX stats_text ON stats (text);
+CREATE INDEX stats_normalized ON stats (normalized);
+CREATE TABLE statics (name TEXT PRIMARY KEY, trade_tag TEXT, icon TEXT);
+"""
+
+
+def parse_api_modifier_trade_ids(trade_api_stats: dict) -> dict:
+    """Parses the trade ids from the trade api"""
+    modifier_trade_ids = {}
+    for res in trade_api_stats["result"]:
+        for entry in res.get("entries"):
+            id = entry.get("id")
+            text = entry.get("text")
+            type = entry.get("type")
+            text = StringUtils.convert_stat_name(text)
+
+            if text not in modifier_trade_ids:
+                modifier_trade_ids[text] = {}
+
+            if type not in modifier_trade_ids[text]:
+                modifier_trade_ids[text][type] = []
+
+            modifier_trade_ids[text][type].append(id)
+    return modifier_trade_ids
+
+
+def parse_api_statics(trade_api_static: dict) -> dict:
+    """Parses the static data from the trade api, such as images or trade-tags"""
+    item_trade_statics = {}
+    for static in trade_api_static["result"]:
+        for entry in static.get("entries"):
+            id = entry.get("id")
+            name = entry.get("text")
+            image = entry.get("image")
+            item_trade_statics[name] = {
+                "tradeTag": id,
+                "icon": f"https://web.poecdn.com/{image}",
+            }
+    return item_trade_statics
+
+
+def source_versions(stats_path: str, static_path: str) -> dict:
+    """Everything the content of the database depends on"""
+    return {
+        "schema": str(SCHEMA_VERSION),
+        "parser": PARSER_VERSION,
+        "stats": file_hash(stats_path),
+        "static": file_hash(static_path),
+    }
+
+
+def build(path: str, stats_path: str, static_path: str) -> None:
+    """Writes the database to a temporary file and moves it into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with output.replacing(path) as tmp:
+        db = sqlite3.connect(tmp)
+        try:
+            db.executescript(SCHEMA)
+            rows = []
+            for (text, types) in parse_api_modifier_trade_ids(read_json(stats_path)).items():
+                if text == None:
+                    continue
+                normalized = TradeStatIndex.normalize(text)
+                for (type, ids) in types.items():
+                    for id in ids:
+                        rows.append((len(rows), text, normalized, type, id))
+            db.executemany("INSERT INTO stats VALUES (?, ?, ?, ?, ?)", rows)
+            db.executemany("INSERT INTO statics VALUES (?, ?, ?)",
+                           ((name, static["tradeTag"], static["icon"]) for (name, static) in parse_api_statics(read_json(static_path)).items()))
+            db.executemany("INSERT INTO meta VALUES (?, ?)", source_versions(stats_path, static_path).items())
+            db.commit()
+        finally:
+            db.close()
+
+
+def is_current(path: str, stats_path: str, static_path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return dict(db.execute("SELECT key, value FROM meta")) == source_versions(stats_path, static_path)
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        db.close()
+
+
+def open_db(cwd: str, cache_dir: str) -> tuple:
+    """(TradeStatIndex, item statics) backed by {cache_dir}/trade.sqlite, which is rebuilt if it's out of date"""
+    path = f"{cache_dir}/trade.sqlite"
+    stats_path = f"{cwd}/api_stats.json"
+    static_path = f"{cwd}/api_static.json"
+    if not is_current(path, stats_path, static_path):
+        print("Building", path)
+        build(path, stats_path, static_path)
+    return (TradeStatIndex(TradeStats(path, "text"), TradeStats(path, "normalized")), TradeStatics(path))
+
+
+def close_db(stats: TradeStatIndex, statics) -> None:
+    """Closes the connections of what open_db returned, trade.sqlite can't be replaced while they are open on Windows
+    The --no-cache dicts are left alone
+    """
+    for table in (stats.exact, stats.normalized, statics):
+        if isinstance(table, ReadOnly):
+            table.close()
+
+
+class ReadOnly:
+    """Lazily opened read-only connection, dropped when pickled"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = None
+        self.memo = {}
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"])
+
+    def execute(self, query: str, args: tuple) -> list:
+        if self.db == None:
+            self.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self.db.execute(query, args).fetchall()
+
+    def close(self) -> None:
+        """Closes the connection, the next query opens it again"""
+        if self.db != None:
+            self.db.close()
+            self.db = None
+
+    def get(self, key: str) -> dict:
+        """Behaves like dict.get, results are memoized"""
+        if key in self.memo:
+            return self.memo[key]
+        value = self.memo[key] = self.query(key)
+        return value
+
+
+class TradeStats(ReadOnly):
+    """stat text -> trade type -> trade ids, looked up by the exact or the normalized text"""
+
+    def __init__(self, path: str, column: str = "text"):
+        super().__init__(path)
+        self.column = column
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path, "column": self.column}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"], state["column"])
+
+    def query(self, text: str) -> dict:
+        if text == None:
+            return None
+        if self.column == "normalized":
+            # the first trade text with this normalized form wins, same as TradeStatIndex
+            first = self.execute("SELECT text FROM stats WHERE normalized = ? ORDER BY position LIMIT 1", (text,))
+            if not first:
+                return None
+            text = first[0][0]
+
+        rows = self.execute("SELECT type, id FROM stats WHERE text = ? ORDER BY position", (text,))
+        if not rows:
+            return None
+        ids = {}
+        for (type, id) in rows:
+            ids.setdefault(type, []).append(id)
+        return ids
+
+
+class TradeStatics(ReadOnly):
+    """item name -> {tradeTag, icon}"""
+
+    def query(self, name: str) -> dict:
+        rows = self.execute("SELECT trade_tag, icon FROM statics WHERE name = ?", (name,))
+        if not rows:
+            return None
+        return {"tradeTag": rows[0][0], "icon": rows[0][1]}
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Builds and queries the compiled trade api lookups")
+    args.add_argument("command", choices=["build", "query"])
+    args.add_argument("text", nargs="?", help="query: stat text or item name")
+    args = args.parse_args()
+
+    cwd = os.getcwd()
+    (stats, statics) = open_db(cwd, f"{cwd}/.cache")
+    if args.command == "query":
+        if args.text == None:
+            print("query needs a text")
+            sys.exit(1)
+        text = StringUtils.convert_stat_name(args.text)
+        result = stats.exact.get(text) or stats.normalized.get(TradeStatIndex.normalize(text)) or statics.get(args.text)
+        print(json.dumps(result, indent=4))
@@ -0,0 +1,224 @@
+"""Checks the generated renderer data against what the renderer expects from it
+
+    python validate.py [--lang en ru] [--examples 20] [--no-literals]
+    python main.py --validate
+
+For every language in renderer/public/data:
+- every stat('...') literal in renderer/src resolves through the matcher or alias
+  index, the renderer throws "Cannot find stat" at startup otherwise
+- every .index.bin entry points at the start of a line whose record has the key,
+  and the index is sorted so the binary search in index.ts works, the same for
+  every posting of the optional stats-trigram.index.bin
+- every alias points at an existing canonical matcher
+- every unique's base resolves through ITEM::refName and has a craftable category,
+  Parser.ts asserts both
+- every file listed in manifest.json has the listed content hash, the gitignored
+  .index.bin files may be missing (a fresh checkout, make-index-files.mjs writes them)
+- trade id coverage of the stats, reported but not an error
+
+Every record is read once and every check is a set or dict lookup. Exits with 1
+if there is any error.
+"""
+import os
+import re
+import sys
+import json
+import struct
+import argparse
+import search
+from index import fnv1a32, INDEX_ENTRY
+from cache import file_hash
+from output import MANIFEST, read_ndjson
+
+CWD = os.getcwd()
+STAT_LITERAL = re.compile(r"""\bstat\((['"])((?:\\.|(?!\1).)*)\1\)""")
+BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+LINE_COMMENT = re.compile(r"""('(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|`(?:\\.|[^`\\])*`)|//.*""") # strings are kept
+ESCAPE = re.compile(r"\\(.)")
+SOURCE_EXTENSIONS = (".ts", ".vue")
+
+
+def find_stat_literals(src_dir: str) -> dict:
+    """text -> ["file:line", ...] of every stat('...') call outside of comments"""
+    literals = {}
+    for (root, dirs, files) in os.walk(src_dir):
+        for file in files:
+            if not file.endswith(SOURCE_EXTENSIONS):
+                continue
+            path = os.path.join(root, file)
+            with open(path, encoding="utf-8") as f:
+                # keep the line numbers, block comments are replaced by their newlines
+                source = BLOCK_COMMENT.sub(lambda match: "\n" * match.group(0).count("\n"), f.read())
+            for (number, line) in enumerate(source.split("\n"), 1):
+                code = LINE_COMMENT.sub(lambda match: match.group(1) or "", line)
+                for match in STAT_LITERAL.finditer(code):
+                    text = ESCAPE.sub(r"\1", match.group(2))
+                    literals.setdefault(text, []).append(f"{os.path.relpath(path, src_dir)}:{number}")
+    return literals
+
+
+def read_index(path: str) -> list:
+    with open(path, "rb") as f:
+        return list(INDEX_ENTRY.iter_unpack(f.read()))
+
+
+class Report:
+    def __init__(self, lang: str):
+        self.lang = lang
+        self.errors = {}    # check -> messages
+        self.warnings = {}  # check -> messages
+        self.stats = {}
+
+    def error(self, check: str, message: str) -> None:
+        self.errors.setdefault(check, []).append(message)
+
+    def warning(self, check: str, message: str) -> None:
+        self.warnings.setdefault(check, []).append(message)
+
+    def print(self, examples: int) -> None:
+        print(f"[{self.lang}] " + ", ".join(f"{key}: {value}" for (key, value) in self.stats.items()))
+        for (kind, checks) in (("error", self.errors), ("warning", self.warnings)):
+            for (check, messages) in checks.items():
+                print(f"[{self.lang}] {kind}: {check}: {len(messages)}")
+                for message in messages[:examples]:
+                    print(f"    {message}")
+                if len(messages) > examples:
+                    print(f"    ... {len(messages) - examples} more")
+
+
+def check_index(report: Report, data_dir: str, name: str, records: dict, keys) -> None:
+    """Every entry has to point at a record with a key of the same hash"""
+    path = f"{data_dir}/{name}.index.bin"
+    if not os.path.exists(path):
+        report.error("missing index", name)
+        return
+    entries = read_index(path)
+    if any(entries[i][0] > entries[i + 1][0] for i in range(len(entries) - 1)):
+        report.error("unsorted index", name)
+    for (hash, start) in entries:
+        record = records.get(start)
+        if record == None:
+            report.error("index points between lines", f"{name}: {hash:#010x} -> {start}")
+        elif not any(fnv1a32(key) == hash for key in keys(record)):
+            report.error("index points at the wrong record", f"{name}: {hash:#010x} -> {start}")
+    report.stats[name] = len(entries)
+
+
+def check_trigrams(report: Report, data_dir: str, stats: dict) -> None:
+    """Every posting of stats-trigram.index.bin has to be the start of a stats.ndjson line"""
+    path = f"{data_dir}/stats-trigram.index.bin"
+    if not os.path.exists(path):
+        return # optional, main.py --search-index
+    with open(path, "rb") as f:
+        data = f.read()
+    (count,) = search.COUNT.unpack_from(data, 0)
+    table = list(search.ENTRY.iter_unpack(data[search.COUNT.size:search.COUNT.size + count * search.ENTRY.size]))
+    if any(table[i][0] >= table[i + 1][0] for i in range(len(table) - 1)):
+        report.error("unsorted index", "stats-trigram")
+    postings = data[search.COUNT.size + count * search.ENTRY.size:]
+    postings = struct.unpack(f"<{len(postings) // 4}I", postings)
+    for (hash, first, size) in table:
+        if first + size > len(postings):
+            report.error("trigram postings out of range", f"{hash:#010x} -> {first}+{size}")
+            continue
+        for start in postings[first:first + size]:
+            if start not in stats:
+                report.error("index points between lines", f"stats-trigram: {hash:#010x} -> {start}")
+    report.stats["stats-trigram"] = count
+
+
+def validate(data_dir: str, lang: str, literals: dict) -> Report:
+    report = Report(lang)
+
+    # stats
+    stats = read_ndjson(f"{data_dir}/stats.ndjson")
+    alias_path = f"{data_dir}/stats-alias.ndjson"
+    aliases = read_ndjson(alias_path) if os.path.exists(alias_path) else {}
+    matchers = set()
+    for stat in stats.values():
+        for matcher in stat["matchers"]:
+            matchers.add(matcher["string"])
+            if matcher.get("advanced"):
+                matchers.add(matcher["advanced"])
+    alias_strings = set()
+    for alias in aliases.values():
+        alias_strings.add(alias["string"])
+        if alias["matcher"] not in matchers:
+            report.error("alias without a matcher", f"{alias['string']!r} -> {alias['matcher']!r}")
+
+    check_index(report, data_dir, "stats-ref", stats, lambda stat: [stat["ref"]])
+    check_index(report, data_dir, "stats-matcher", stats, lambda stat: [m["string"] for m in stat["matchers"]] + [m["advanced"] for m in stat["matchers"] if m.get("advanced")])
+    if aliases:
+        check_index(report, data_dir, "stats-alias", aliases, lambda alias: [alias["string"]])
+    check_trigrams(report, data_dir, stats)
+
+    for (text, locations) in literals.items():
+        if text not in matchers and text not in alias_strings:
+            report.error("stat literal not found", f"{text!r} ({', '.join(locations)})")
+
+    untraded = [stat for stat in stats.values() if not stat["trade"]["ids"]]
+    for stat in untraded:
+        report.warning("no trade ids", stat.get("id") or stat["ref"])
+
+    # items
+    items = read_ndjson(f"{data_dir}/items.ndjson")
+    by_ref = {}
+    for item in items.values():
+        by_ref.setdefault(f"{item['namespace']}::{item['refName']}", []).append(item)
+    check_index(report, data_dir, "items-name", items, lambda item: [f"{item['namespace']}::{item['name']}"])
+    check_index(report, data_dir, "items-ref", items, lambda item: [f"{item['namespace']}::{item['refName']}"])
+
+    uniques = [item for item in items.values() if item.get("unique")]
+    for unique in uniques:
+        base = by_ref.get(f"ITEM::{unique['unique']['base']}")
+        if base == None:
+            report.error("unique base not found", f"{unique['name']} -> {unique['unique']['base']}")
+        elif not base[0].get("craftable"):
+            report.error("unique base not craftable", f"{unique['name']} -> {unique['unique']['base']}")
+
+    # manifest
+    if os.path.exists(f"{data_dir}/{MANIFEST}"):
+        with open(f"{data_dir}/{MANIFEST}", encoding="utf-8") as f:
+            files = json.load(f)["files"]
+        for (name, entry) in files.items():
+            if not os.path.exists(f"{data_dir}/{name}"):
+                if not name.endswith(".index.bin"):
+                    report.error("manifest lists a missing file", name)
+            elif file_hash(f"{data_dir}/{name}") != entry["sha1"]:
+                report.error("manifest hash mismatch", name)
+    
+    report.stats.update({
+        "stats": len(stats),
+        "aliases": len(aliases),
+        "trade coverage": f"{100 * (len(stats) - len(untraded)) / max(len(stats), 1):.1f}%",
+        "items": len(items),
+        "uniques": len(uniques),
+        "stat literals": len(literals),
+    })
+    return report
+
+
+def validate_all(cwd: str, languages: list = None, literals: bool = True, examples: int = 20) -> bool:
+    """Validates every generated language (or the given ones), prints the reports and returns whether there were no errors"""
+    renderer = f"{cwd}/../renderer"
+    data = f"{renderer}/public/data"
+    found = find_stat_literals(f"{renderer}/src") if literals else {}
+    if languages == None:
+        languages = sorted(lang for lang in os.listdir(data) if os.path.exists(f"{data}/{lang}/stats.ndjson"))
+
+    ok = True
+    for lang in languages:
+        report = validate(f"{data}/{lang}", lang, found)
+        report.print(examples)
+        ok = ok and not report.errors
+    return ok
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Checks the generated renderer data")
+    args.add_argument("--lang", nargs="+", help="language codes to check, all generated ones by default")
+    args.add_argument("--examples", type=int, default=20, help="failures printed per check")
+    args.add_argument("--no-literals", action="store_true", help="don't check the stat('...') literals of the renderer")
+    args = args.parse_args()
+
+    sys.exit(0 if validate_all(CWD, args.lang, not args.no_literals, args.examples) else 1)
@@ -0,0 +1,66 @@
+"""Polls the exported files and reports what changed, for main.py --watch
+
+The standard library has no file change notifications, so the watched
+directories are rescanned every interval and compared by mtime and size.
+A change is only reported once a scan finds nothing new, an export writes
+a lot of files one after another and they should be handled together.
+
+    python main.py --watch [--interval 0.5]
+"""
+import os
+import time
+
+INTERVAL = 0.5 # seconds
+
+
+def snapshot(cwd: str, paths: list) -> dict:
+    """path relative to cwd -> (mtime, size) of every file below the given paths"""
+    files = {}
+    for path in paths:
+        path = os.path.join(cwd, path)
+        if os.path.isfile(path):
+            walk = [(os.path.dirname(path), [], [os.path.basename(path)])]
+        else:
+            walk = os.walk(path)
+        for (root, dirs, names) in walk:
+            for name in names:
+                full = os.path.join(root, name)
+                try:
+                    stat = os.stat(full)
+                except FileNotFoundError:
+                    continue # removed while scanning
+                files[os.path.relpath(full, cwd).replace(os.sep, "/")] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff(before: dict, after: dict) -> set:
+    """Files added, removed or modified between two snapshots"""
+    return {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+
+
+def watch(cwd: str, paths: list, callback, interval: float = INTERVAL) -> None:
+    """Calls callback(sorted changed paths) whenever files below paths change, until interrupted
+    callback has to handle its own errors, anything it raises ends the watch
+    """
+    current = snapshot(cwd, paths)
+    print(f"Watching {', '.join(paths)} for changes (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            latest = snapshot(cwd, paths)
+            changed = diff(current, latest)
+            if not changed:
+                continue
+            # wait until the export settles
+            while True:
+                time.sleep(interval)
+                settled = snapshot(cwd, paths)
+                more = diff(latest, settled)
+                if not more:
+                    break
+                changed |= more
+                latest = settled
+            current = latest
+            callback(sorted(changed))
+    except KeyboardInterrupt:
+        pass
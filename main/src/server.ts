@@ -21,7 +21,9 @@ if (!process.env.VITE_DEV_SERVER_URL) {
   server.addListener('request', (req, res) => {
     if (req.url?.startsWith('/config') || req.url?.startsWith('/uploads') || req.url?.startsWith('/proxy')) return
 
-    const filePath = (req.url === '/') ? '/index.html' : req.url!
+    // data urls carry the content hash as ?v=<sha1>
+    const pathname = req.url!.split('?')[0]
+    const filePath = (pathname === '/') ? '/index.html' : pathname
     switch (path.extname(filePath)) {
       case '.html': res.setHeader('content-type', 'text/html'); break;
       case '.js': res.setHeader('content-type', 'text/javascript'); break;
@@ -30,6 +32,14 @@ if (!process.env.VITE_DEV_SERVER_URL) {
     }
 
     fs.createReadStream(path.join(__dirname, filePath))
+      .on('error', () => {
+        // missing files get a 404 instead of no answer, the renderer checks for optional data files like manifest.json
+        if (!res.headersSent) {
+          res.removeHeader('content-type')
+          res.statusCode = 404
+        }
+        res.end()
+      })
       .pipe(res)
   })
 }
@@ -73,11 +73,27 @@ function itemNamesFromLines (items: Generator<BaseType>) {
   }
 }
 
+// file -> content hash of the generated data of the current language, from manifest.json
+let MANIFEST: Record<string, { sha1: string, size: number }> = {}
+
+// the content hash in the url lets the browser keep a file until it actually changes
+function dataUrl (language: string, file: string) {
+  const hash = MANIFEST[file]?.sha1
+  return `${import.meta.env.BASE_URL}data/${language}/${file}` + (hash ? `?v=${hash.slice(0, 12)}` : '')
+}
+
+async function fetchOptional (url: string, init?: RequestInit) {
+  const res = await fetch(url, init)
+  // the dev server answers missing files with index.html
+  if (!res.ok || res.headers.get('content-type')?.includes('text/html')) return undefined
+  return res
+}
+
 async function loadItems (language: string) {
-  const ndjson = await (await fetch(`${import.meta.env.BASE_URL}data/${language}/items.ndjson`)).text()
+  const ndjson = await (await fetch(dataUrl(language, 'items.ndjson'))).text()
   const INDEX_WIDTH = 2
-  const indexNames = new Uint32Array(await (await fetch(`${import.meta.env.BASE_URL}data/${language}/items-name.index.bin`)).arrayBuffer())
-  const indexRefNames = new Uint32Array(await (await fetch(`${import.meta.env.BASE_URL}data/${language}/items-ref.index.bin`)).arrayBuffer())
+  const indexNames = new Uint32Array(await (await fetch(dataUrl(language, 'items-name.index.bin'))).arrayBuffer())
+  const indexRefNames = new Uint32Array(await (await fetch(dataUrl(language, 'items-ref.index.bin'))).arrayBuffer())
 
   function commonFind (index: Uint32Array, prop: 'name' | 'refName') {
     return function (ns: BaseType['namespace'], name: string): BaseType[] | undefined {
@@ -106,10 +122,16 @@ async function loadItems (language: string) {
 }
 
 async function loadStats (language: string) {
-  const ndjson = await (await fetch(`${import.meta.env.BASE_URL}data/${language}/stats.ndjson`)).text()
+  const ndjson = await (await fetch(dataUrl(language, 'stats.ndjson'))).text()
   const INDEX_WIDTH = 2
-  const indexRef = new Uint32Array(await (await fetch(`${import.meta.env.BASE_URL}data/${language}/stats-ref.index.bin`)).arrayBuffer())
-  const indexMatcher = new Uint32Array(await (await fetch(`${import.meta.env.BASE_URL}data/${language}/stats-matcher.index.bin`)).arrayBuffer())
+  const indexRef = new Uint32Array(await (await fetch(dataUrl(language, 'stats-ref.index.bin'))).arrayBuffer())
+  const indexMatcher = new Uint32Array(await (await fetch(dataUrl(language, 'stats-matcher.index.bin'))).arrayBuffer())
+  // other forms of the matchers (raw translation strings etc.) -> canonical matcher, older data doesn't have it
+  const hasAlias = 'stats-alias.ndjson' in MANIFEST
+  const aliasNdjson = hasAlias ? await (await fetch(dataUrl(language, 'stats-alias.ndjson'))).text() : ''
+  const indexAlias = hasAlias
+    ? new Uint32Array(await (await fetch(dataUrl(language, 'stats-alias.index.bin'))).arrayBuffer())
+    : new Uint32Array(0)
 
   STAT_BY_REF = function (ref: string) {
     let start = dataBinarySearch(indexRef, Number(fnv1a(ref, { size: 32 })), 0, INDEX_WIDTH)
@@ -119,7 +141,7 @@ async function loadStats (language: string) {
     return JSON.parse(ndjson.slice(start, end))
   }
 
-  STAT_BY_MATCH_STR = function (matchStr: string) {
+  function findByMatcher (matchStr: string) {
     let start = dataBinarySearch(indexMatcher, Number(fnv1a(matchStr, { size: 32 })), 0, INDEX_WIDTH)
     console.log(start, matchStr);
     
@@ -137,6 +159,22 @@ async function loadStats (language: string) {
     return { stat, matcher }
   }
 
+  STAT_BY_MATCH_STR = function (matchStr: string) {
+    const found = findByMatcher(matchStr)
+    if (found) return found
+
+    let start = dataBinarySearch(indexAlias, Number(fnv1a(matchStr, { size: 32 })), 0, INDEX_WIDTH)
+    if (start === -1) return undefined
+    start = indexAlias[start * INDEX_WIDTH + 1]
+    const end = aliasNdjson.indexOf('\n', start)
+    const alias = JSON.parse(aliasNdjson.slice(start, end)) as { string: string, matcher: string }
+    if (alias.string !== matchStr) {
+      // fnv1a32 collision
+      return undefined
+    }
+    return findByMatcher(alias.matcher)
+  }
+
   STATS_ITERATOR = ndjsonFindLines<Stat>(ndjson)
 }
 
@@ -164,6 +202,9 @@ export async function init (lang: string) {
 }
 
 export async function loadForLang (lang: string) {
+  // older data doesn't have a manifest, the files are fetched without a hash then
+  const manifestRes = await fetchOptional(`${import.meta.env.BASE_URL}data/${lang}/manifest.json`, { cache: 'no-cache' })
+  MANIFEST = manifestRes ? (await manifestRes.json()).files : {}
   CLIENT_STRINGS = (await import(/* @vite-ignore */`${import.meta.env.BASE_URL}data/${lang}/client_strings.js`)).default
   await loadItems(lang)
   await loadStats(lang)
@@ -57,6 +57,31 @@ for (const lang of LANGUAGES) {
       indexData
     )
   }
+
+  if (fs.existsSync(`./public/data/${lang}/stats-alias.ndjson`)) {
+    const ndjson = fs.readFileSync(`./public/data/${lang}/stats-alias.ndjson`, { encoding: 'utf-8' })
+    /** @type{Array<{ hash: number, start: number }>} */
+    const aliases = []
+    let start = 0
+    while (start !== ndjson.length) {
+      const end = ndjson.indexOf('\n', start)
+      /** @type {{ string: string, matcher: string }} */
+      const alias = JSON.parse(ndjson.slice(start, end))
+      aliases.push({ start, hash: Number(fnv1a(alias.string, { size: 32 })) })
+      start = (end + 1)
+    }
+
+    const indexData = new Uint32Array(aliases.length * 2)
+    aliases.sort((a, b) => a.hash - b.hash)
+    for (let i = 0; i < aliases.length; i += 1) {
+      indexData[i * 2 + 0] = aliases[i].hash
+      indexData[i * 2 + 1] = aliases[i].start
+    }
+    fs.writeFileSync(
+      path.join('./public/data', lang, 'stats-alias.index.bin'),
+      indexData
+    )
+  }
 }
 
 for (const lang of LANGUAGES) {